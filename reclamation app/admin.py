@@ -1,9 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, abort, jsonify
+from flask import Blueprint, Response, render_template, request, redirect, url_for, abort, jsonify, send_from_directory
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-from database import get_db
-from auth import role_required
+from database import get_db, pool_stats, replica_stats, write_queue_stats
+from auth import role_required, invalidate_user, user_cache_stats
 from time_utils import now_local_str
+import refdata
+import counters
+import bulk_import
+from events import publish, STAFF_ROLES
+from notifications import notification_stats
+import metrics
+import profiling
+from config import PROFILE_DIR, PROFILE_SAMPLE_RATE
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -12,31 +20,41 @@ admin_bp = Blueprint("admin", __name__)
 @role_required("admin")
 def admin_dashboard():
     db = get_db()
+    stored = counters.get_counts(db)
+    db.close()
     counts = {
-        "users": db.execute("SELECT COUNT(*) AS cnt FROM users").fetchone()["cnt"],
-        "bureaux": db.execute("SELECT COUNT(*) AS cnt FROM bureaux").fetchone()["cnt"],
-        "types": db.execute("SELECT COUNT(*) AS cnt FROM types_reclamation").fetchone()["cnt"],
-        "reclamations": db.execute("SELECT COUNT(*) AS cnt FROM reclamations").fetchone()["cnt"],
-        "pending": db.execute("SELECT COUNT(*) AS cnt FROM users WHERE active = 0").fetchone()["cnt"],
+        "users": stored.get("users", 0),
+        "bureaux": stored.get("bureaux", 0),
+        "types": stored.get("types", 0),
+        "reclamations": stored.get("reclamations", 0),
+        "pending": stored.get("pending_users", 0),
     }
-    db.close()
-    return render_template("admin_dashboard.html", counts=counts)
+    status_counts = [(statut, stored.get(counters.status_key(statut), 0)) for statut in counters.STATUTS]
+    bureau_counts = []
+    for bureau in refdata.bureaux().rows:
+        count = stored.get(counters.bureau_key(bureau["id"]), 0)
+        if count:
+            bureau_counts.append((bureau["nom_bureau"], count))
+    bureau_counts.sort(key=lambda item: item[1], reverse=True)
+    return render_template(
+        "admin_dashboard.html",
+        counts=counts,
+        status_counts=status_counts,
+        bureau_counts=bureau_counts,
+    )
 
 @admin_bp.route("/admin/notifications", methods=["GET"])
 @login_required
 @role_required("admin", "supervisor")
 def notifications():
     db = get_db()
-    pending_reclamations = db.execute(
-        "SELECT COUNT(*) AS cnt FROM reclamations WHERE statut = 'EN_ATTENTE' AND archived = 0"
-    ).fetchone()["cnt"]
+    stored = counters.get_counts(db, ["pending_reclamations", "pending_users"])
+    db.close()
+    pending_reclamations = stored["pending_reclamations"]
     if current_user.role == "admin":
-        pending_users = db.execute(
-            "SELECT COUNT(*) AS cnt FROM users WHERE active = 0"
-        ).fetchone()["cnt"]
+        pending_users = stored["pending_users"]
     else:
         pending_users = 0
-    db.close()
     return jsonify(
         {
             "pending_reclamations": pending_reclamations,
@@ -44,12 +62,54 @@ def notifications():
         }
     )
 
+@admin_bp.route("/admin/metrics", methods=["GET"])
+@login_required
+@role_required("admin")
+def metrics_report():
+    caches = {
+        "db_pool": pool_stats(),
+        "db_writes": write_queue_stats(),
+        "db_replica": replica_stats(),
+        "user_cache": user_cache_stats(),
+        "notifications": notification_stats(),
+    }
+    if request.args.get("format") == "prometheus":
+        gauges = {
+            f"{group}_{name}": value
+            for group, values in caches.items()
+            for name, value in values.items()
+            if isinstance(value, (int, float))
+        }
+        return Response(
+            metrics.prometheus_text(gauges),
+            mimetype="text/plain; version=0.0.4",
+        )
+    return jsonify(dict(metrics.queries.snapshot(), requests=metrics.request_stats.snapshot(), **caches))
+
+@admin_bp.route("/admin/performance", methods=["GET"])
+@login_required
+@role_required("admin")
+def performance():
+    return render_template(
+        "admin_performance.html",
+        endpoints=metrics.request_stats.snapshot(),
+        slow_queries=metrics.queries.snapshot()["slow_queries"][-20:][::-1],
+        profiles=profiling.list_profiles(),
+        sample_rate=PROFILE_SAMPLE_RATE,
+    )
+
+@admin_bp.route("/admin/performance/profiles/<path:name>", methods=["GET"])
+@login_required
+@role_required("admin")
+def download_profile(name):
+    return send_from_directory(PROFILE_DIR, name, as_attachment=True)
+
 @admin_bp.route("/admin/users", methods=["GET", "POST"])
 @login_required
 @role_required("admin")
 def manage_users():
+    bureaux = refdata.bureaux().rows
     db = get_db()
-    bureaux = db.execute("SELECT id, code_bureau, nom_bureau FROM bureaux ORDER BY nom_bureau").fetchall()
     error = None
     if request.method == "POST":
         username = request.form.get("username", "").strip()
@@ -73,6 +133,7 @@ def manage_users():
                     """,
                     (username, generate_password_hash(password), role, bureau_id, prenom, nom, matricule, now_local_str()),
                 )
+                counters.bump(db, {"users": 1})
                 db.commit()
 
     users = db.execute(
@@ -94,12 +155,16 @@ def update_user(user_id):
     active = request.form.get("active") == "1"
     bureau_id = request.form.get("bureau_id") or None
     db = get_db()
+    previous = db.execute("SELECT active FROM users WHERE id = ?", (user_id,)).fetchone()
     db.execute(
         "UPDATE users SET role = ?, active = ?, bureau_id = ? WHERE id = ?",
         (role, 1 if active else 0, bureau_id, user_id),
     )
+    if previous:
+        counters.bump(db, counters.user_activity_changed(previous["active"], 1 if active else 0))
     db.commit()
     db.close()
+    invalidate_user(user_id)
     return redirect(url_for("admin.manage_users"))
 
 @admin_bp.route("/admin/users/<int:user_id>/delete", methods=["POST"])
@@ -107,10 +172,14 @@ def update_user(user_id):
 @role_required("admin")
 def delete_user(user_id):
     db = get_db()
+    previous = db.execute("SELECT active FROM users WHERE id = ?", (user_id,)).fetchone()
     # Soft delete: deactivate user to preserve history
     db.execute("UPDATE users SET active = 0 WHERE id = ?", (user_id,))
+    if previous:
+        counters.bump(db, counters.user_activity_changed(previous["active"], 0))
     db.commit()
     db.close()
+    invalidate_user(user_id)
     return redirect(url_for("admin.manage_users"))
 
 @admin_bp.route("/admin/pending", methods=["GET", "POST"])
@@ -122,11 +191,15 @@ def pending_users():
         user_id = request.form.get("user_id")
         action = request.form.get("action")
         if user_id and action in ["approve", "reject"]:
-            if action == "approve":
-                db.execute("UPDATE users SET active = 1 WHERE id = ?", (user_id,))
-            else:
-                db.execute("UPDATE users SET active = 0 WHERE id = ?", (user_id,))
+            previous = db.execute("SELECT active FROM users WHERE id = ?", (user_id,)).fetchone()
+            new_active = 1 if action == "approve" else 0
+            db.execute("UPDATE users SET active = ? WHERE id = ?", (new_active, user_id))
+            if previous:
+                counters.bump(db, counters.user_activity_changed(previous["active"], new_active))
             db.commit()
+            invalidate_user(user_id)
+            if action == "approve" and previous and previous["active"] == 0:
+                publish("user_validated", {"user_id": user_id, "pending_users": -1}, roles=("admin",))
 
     pending = db.execute(
         """
@@ -140,6 +213,44 @@ def pending_users():
     db.close()
     return render_template("admin_pending.html", pending=pending)
 
+@admin_bp.route("/admin/import", methods=["GET", "POST"])
+@login_required
+@role_required("admin")
+def import_reclamations():
+    error = None
+    result = None
+    if request.method == "POST":
+        upload = request.files.get("fichier")
+        if not upload or upload.filename == "":
+            error = "Veuillez choisir un fichier."
+        else:
+            db = get_db()
+            try:
+                result = bulk_import.import_rows(
+                    db,
+                    bulk_import.read_rows(upload.stream, upload.filename),
+                    current_user.id,
+                    current_user.bureau_id,
+                )
+            except ValueError as exc:
+                error = str(exc)
+            db.close()
+            if result and result["created"]:
+                publish(
+                    "reclamation_created",
+                    {
+                        "numero_dossier": result["last"],
+                        "pending_reclamations": result["created"],
+                    },
+                    roles=STAFF_ROLES,
+                )
+    return render_template(
+        "admin_import.html",
+        error=error,
+        result=result,
+        columns=bulk_import.COLUMNS,
+    )
+
 @admin_bp.route("/admin/bureaux", methods=["GET", "POST"])
 @login_required
 @role_required("admin")
@@ -163,7 +274,9 @@ def manage_bureaux():
                 "INSERT INTO bureaux (code_bureau, nom_bureau, province) VALUES (?, ?, ?)",
                 (code, nom, province),
             )
+            counters.bump(db, {"bureaux": 1})
             db.commit()
+            refdata.invalidate("bureaux")
 
     bureaux = db.execute(
         "SELECT id, code_bureau, nom_bureau, province FROM bureaux ORDER BY province, nom_bureau"
@@ -184,7 +297,9 @@ def manage_types():
                 "INSERT INTO types_reclamation (code, libelle) VALUES (?, ?)",
                 (code, libelle),
             )
+            counters.bump(db, {"types": 1})
             db.commit()
+            refdata.invalidate("types")
 
     types = db.execute(
         "SELECT id, code, libelle, actif FROM types_reclamation ORDER BY libelle"
@@ -208,4 +323,5 @@ def toggle_type(type_id):
     db.execute("UPDATE types_reclamation SET actif = ? WHERE id = ?", (new_val, type_id))
     db.commit()
     db.close()
+    refdata.invalidate("types")
     return redirect(url_for("admin.manage_types"))
@@ -1,9 +1,16 @@
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from flask import Blueprint, render_template, redirect, url_for, request, flash, abort
 from flask_login import UserMixin, login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
+from config import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
 from database import get_db
 from time_utils import now_local_str
+import refdata
+import counters
+from events import publish
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -17,16 +24,56 @@ class User(UserMixin):
         self.nom = nom
         self.matricule = matricule
 
+# Bounded LRU of active users keyed by id. Every route that changes a user
+# calls invalidate_user(), the TTL only bounds staleness across processes.
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+_user_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+_user_cache_generation = 0
+
+def invalidate_user(user_id):
+    global _user_cache_generation
+    with _user_cache_lock:
+        _user_cache_generation += 1
+        _user_cache.pop(str(user_id), None)
+        _user_cache_stats["invalidations"] += 1
+
+def user_cache_stats():
+    with _user_cache_lock:
+        return dict(_user_cache_stats, size=len(_user_cache))
+
 def load_user(user_id):
-    db = get_db()
-    user = db.execute(
-        "SELECT id, username, role, bureau_id, prenom, nom, matricule FROM users WHERE id = ? AND active = 1",
-        (user_id,),
-    ).fetchone()
-    db.close()
+    key = str(user_id)
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(key)
+        if entry and now - entry[0] < USER_CACHE_TTL_SECONDS:
+            _user_cache.move_to_end(key)
+            _user_cache_stats["hits"] += 1
+            return entry[1]
+        _user_cache_stats["misses"] += 1
+        generation = _user_cache_generation
+
+    with get_db(primary=True) as db:
+        user = db.execute(
+            "SELECT id, username, role, bureau_id, prenom, nom, matricule FROM users WHERE id = ? AND active = 1",
+            (user_id,),
+        ).fetchone()
     if not user:
+        with _user_cache_lock:
+            _user_cache.pop(key, None)
         return None
-    return User(user["id"], user["username"], user["role"], user["bureau_id"], user["prenom"], user["nom"], user["matricule"])
+    loaded = User(user["id"], user["username"], user["role"], user["bureau_id"], user["prenom"], user["nom"], user["matricule"])
+    with _user_cache_lock:
+        # A user changed while we were reading: don't cache a possibly stale row.
+        if generation != _user_cache_generation:
+            return loaded
+        _user_cache[key] = (now, loaded)
+        _user_cache.move_to_end(key)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+            _user_cache_stats["evictions"] += 1
+    return loaded
 
 def role_required(*roles):
     def decorator(fn):
@@ -82,8 +129,8 @@ def login():
 @auth_bp.route("/register", methods=["GET", "POST"])
 def register():
     error = None
+    bureaux = refdata.bureaux().rows
     db = get_db()
-    bureaux = db.execute("SELECT id, code_bureau, nom_bureau FROM bureaux").fetchall()
     admin_exists = db.execute(
         "SELECT id FROM users WHERE role = 'admin' LIMIT 1"
     ).fetchone()
@@ -121,8 +168,11 @@ def register():
                     """,
                     (username, generate_password_hash(password), role, bureau_id, prenom, nom, matricule, active, now_local_str()),
                 )
+                counters.bump(db, {"users": 1, "pending_users": int(active == 0)})
                 db.commit()
                 db.close()
+                if active == 0:
+                    publish("user_registered", {"username": username, "pending_users": 1}, roles=("admin",))
                 if active == 1:
                     flash("Compte cree. Vous pouvez vous connecter.", "success")
                 else:
@@ -164,6 +214,7 @@ def profile():
             )
             db.commit()
             db.close()
+            invalidate_user(current_user.id)
             flash("Profil mis a jour.", "success")
             return redirect(url_for("auth.profile"))
 
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+# Run from the application directory:
+#   python -m benchmarks run --reclamations 20000 --threads 8 --output before.json
+#   python -m benchmarks compare before.json after.json
+# Without DATABASE_URL the run uses a throwaway SQLite file and upload folder.
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="seed a dataset and measure the hot endpoints")
+    run.add_argument("--bureaux", type=int, default=50)
+    run.add_argument("--users", type=int, default=200)
+    run.add_argument("--reclamations", type=int, default=20000)
+    run.add_argument("--history-per", type=int, default=3)
+    run.add_argument("--attachments", type=int, default=2000)
+    run.add_argument("--threads", type=int, default=8)
+    run.add_argument("--requests", type=int, default=400, help="requests per scenario")
+    run.add_argument("--scenarios", default="", help="comma-separated subset (default: all)")
+    run.add_argument("--workdir", default="", help="SQLite file and uploads location (default: temporary)")
+    run.add_argument("--no-seed", action="store_true", help="reuse an already seeded database")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--output", default="", help="write the JSON report here instead of stdout")
+
+    compare = commands.add_parser("compare", help="compare two JSON reports")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    return parser.parse_args(argv)
+
+def _run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="reclamation-bench-")
+    os.environ.setdefault("DATABASE_PATH", os.path.join(workdir, "bench.db"))
+    os.environ.setdefault("UPLOAD_FOLDER", os.path.join(workdir, "uploads"))
+    os.makedirs(os.environ["UPLOAD_FOLDER"], exist_ok=True)
+
+    from database import get_db, is_postgres
+    from models import init_db
+    from reclam import app
+    from notifications import dispatcher
+    from benchmarks import runner, seed
+
+    app.config["TESTING"] = True
+    # Measure the request path, not the desktop toasts it queues.
+    dispatcher.sinks.clear()
+
+    try:
+        init_db()
+        seed_seconds = None
+        if not args.no_seed:
+            started = time.perf_counter()
+            with get_db() as db:
+                seed.seed(
+                    db,
+                    bureaux=args.bureaux,
+                    users=args.users,
+                    reclamations=args.reclamations,
+                    history_per=args.history_per,
+                    attachments=args.attachments,
+                    seed=args.seed,
+                )
+            seed_seconds = round(time.perf_counter() - started, 3)
+            print(f"Seeded in {seed_seconds}s.", file=sys.stderr)
+
+        with get_db() as db:
+            ctx = runner.Context(db)
+
+        names = [name for name in args.scenarios.split(",") if name] or list(runner.SCENARIOS)
+        results = {}
+        for name in names:
+            results[name] = runner.run_scenario(app, ctx, name, args.requests, args.threads, seed.PASSWORD, args.seed)
+            print(f"{name}: {results[name]['throughput_rps']} req/s, p95 {results[name]['p95_ms']} ms", file=sys.stderr)
+        results["reminder_cycle"] = runner.run_reminder_cycle()
+
+        report = {
+            "meta": {
+                "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "backend": "postgres" if is_postgres() else "sqlite",
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "threads": args.threads,
+                "requests_per_scenario": args.requests,
+                "dataset": {
+                    "bureaux": args.bureaux,
+                    "users": args.users,
+                    "reclamations": args.reclamations,
+                    "history_per": args.history_per,
+                    "attachments": args.attachments,
+                    "seed": args.seed,
+                },
+                "seed_seconds": seed_seconds,
+            },
+            "results": results,
+        }
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(output + "\n")
+    else:
+        print(output)
+
+def _compare(args):
+    with open(args.before, encoding="utf-8") as stream:
+        before = json.load(stream)["results"]
+    with open(args.after, encoding="utf-8") as stream:
+        after = json.load(stream)["results"]
+    print(f"{'scenario':24} {'p50 ms':>18} {'p95 ms':>18} {'req/s':>18}")
+    for name in before:
+        if name not in after:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "throughput_rps"):
+            old, new = before[name][key], after[name][key]
+            change = f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+            cells.append(f"{new:>10} ({change:>5})")
+        print(f"{name:24} {' '.join(cells)}")
+
+if __name__ == "__main__":
+    arguments = _parse_args(sys.argv[1:])
+    if arguments.command == "run":
+        _run(arguments)
+    else:
+        _compare(arguments)
@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from time_utils import now_local
+
+class Context:
+    # What the scenarios need to pick realistic targets, read once from the
+    # seeded database.
+    def __init__(self, db):
+        self.agents = [row["username"] for row in db.execute(
+            "SELECT username FROM users WHERE username LIKE 'bench_agent_%' ORDER BY id LIMIT 200"
+        ).fetchall()]
+        self.supervisors = [row["username"] for row in db.execute(
+            "SELECT username FROM users WHERE username LIKE 'bench_sup_%' ORDER BY id LIMIT 50"
+        ).fetchall()]
+        bounds = db.execute("SELECT MIN(id) AS lo, MAX(id) AS hi FROM reclamations").fetchone()
+        self.reclamation_range = (bounds["lo"], bounds["hi"])
+        self.filenames = [row["filename"] for row in db.execute(
+            "SELECT filename FROM pieces_jointes ORDER BY id LIMIT 1000"
+        ).fetchall()]
+        self.bureau_ids = [row["id"] for row in db.execute(
+            "SELECT id FROM bureaux WHERE province = 'BENCH' ORDER BY id LIMIT 100"
+        ).fetchall()]
+        self.type_ids = [row["id"] for row in db.execute(
+            "SELECT id FROM types_reclamation WHERE actif = 1 AND code != 'AUTRE'"
+        ).fetchall()]
+        if not self.agents or not self.supervisors:
+            raise RuntimeError("No benchmark users found: seed the database first.")
+
+def _dashboard(query=""):
+    return lambda client, ctx, rng: client.get(f"/dashboard{query}")
+
+def _dashboard_bureau(client, ctx, rng):
+    return client.get(f"/dashboard?bureau_id={rng.choice(ctx.bureau_ids)}")
+
+def _dashboard_type(client, ctx, rng):
+    return client.get(f"/dashboard?type_id={rng.choice(ctx.type_ids)}")
+
+def _view_reclamation(client, ctx, rng):
+    return client.get(f"/reclamation/{rng.randint(*ctx.reclamation_range)}")
+
+def _new_reclamation(client, ctx, rng):
+    return client.post(
+        "/reclamation/new",
+        data={
+            "numero_compte": str(rng.randint(10 ** 9, 10 ** 10 - 1)),
+            "nom_client": "Bench Client",
+            "type_id": str(rng.choice(ctx.type_ids)),
+            "ancienne_valeur": "0340000000",
+            "nouvelle_valeur": "0320000000",
+            "motif": "",
+        },
+    )
+
+def _download_piece(client, ctx, rng):
+    return client.get(f"/uploads/{rng.choice(ctx.filenames)}")
+
+def _user_notifications(client, ctx, rng):
+    since = (now_local() - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S")
+    return client.get(f"/notifications/user?since={since}")
+
+def _admin_notifications(client, ctx, rng):
+    return client.get("/admin/notifications")
+
+# name: (role, request, accepted status codes)
+SCENARIOS = {
+    "dashboard": ("supervisor", _dashboard(), (200,)),
+    "dashboard_agent": ("agent", _dashboard(), (200,)),
+    "dashboard_statut": ("supervisor", _dashboard("?statut=EN_ATTENTE"), (200,)),
+    "dashboard_bureau": ("supervisor", _dashboard_bureau, (200,)),
+    "dashboard_type": ("supervisor", _dashboard_type, (200,)),
+    "dashboard_search": ("supervisor", _dashboard("?search=rakoto%20elise"), (200,)),
+    "dashboard_archived": ("supervisor", _dashboard("?archived=1"), (200,)),
+    "view_reclamation": ("supervisor", _view_reclamation, (200,)),
+    "new_reclamation": ("agent", _new_reclamation, (302,)),
+    "download_piece": ("supervisor", _download_piece, (200,)),
+    "notifications_user": ("agent", _user_notifications, (200,)),
+    "notifications_admin": ("supervisor", _admin_notifications, (200,)),
+}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    rank = fraction * (len(sorted_values) - 1)
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+def _login(app, username, password):
+    client = app.test_client()
+    response = client.post("/login", data={"username": username, "password": password})
+    if response.status_code != 302:
+        raise RuntimeError(f"Login failed for {username} ({response.status_code}).")
+    return client
+
+def run_scenario(app, ctx, name, requests, threads, password, seed=1):
+    role, make_request, accepted = SCENARIOS[name]
+    users = ctx.agents if role == "agent" else ctx.supervisors
+    # Logging in is not part of the measurement.
+    clients = [_login(app, users[i % len(users)], password) for i in range(threads)]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = clients[index]
+        local = []
+        failed = 0
+        for _ in range(requests // threads + (1 if index < requests % threads else 0)):
+            started = time.perf_counter()
+            try:
+                response = make_request(client, ctx, rng)
+                response.get_data()
+                ok = response.status_code in accepted
+                response.close()
+            except Exception:
+                ok = False
+            local.append(time.perf_counter() - started)
+            failed += not ok
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+def run_reminder_cycle():
+    from reminder_worker import _process_due_reminders
+
+    started = time.perf_counter()
+    _process_due_reminders()
+    return summarize([time.perf_counter() - started], 0, time.perf_counter() - started)
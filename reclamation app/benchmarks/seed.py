@@ -0,0 +1,144 @@
+import os
+import random
+import tempfile
+from datetime import timedelta
+from uuid import uuid4
+from werkzeug.security import generate_password_hash
+import counters
+import reclamation_store
+import refdata
+import storage
+from time_utils import now_local
+
+PASSWORD = "bench"
+STATUTS = [("EN_ATTENTE", 45), ("EN_COURS", 25), ("TRAITEE", 25), ("REJETEE", 5)]
+SURNAMES = ["Rakoto", "Rabe", "Randriamanana", "Razafindrakoto", "Rasoanaivo", "Andriamihaja", "Ravelo", "Rajaonarison"]
+FIRST_NAMES = ["Élise", "Hery", "Fanja", "Tojo", "Mialy", "Njaka", "Voahangy", "Andry", "Lalaina", "José"]
+RECLAMATION_COLUMNS = reclamation_store.RECLAMATION_COLUMNS + ("updated_at", "reminder_auto_at")
+CHUNK_SIZE = 5000
+
+def _fmt(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+def _chunks(rows, size=CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def _seed_bureaux(db, count):
+    rows = [(f"B{i:05d}", f"BENCH BUREAU {i}", "BENCH") for i in range(1, count + 1)]
+    db.executemany("INSERT INTO bureaux (code_bureau, nom_bureau, province) VALUES (?, ?, ?)", rows)
+    return [row["id"] for row in db.execute("SELECT id FROM bureaux WHERE province = 'BENCH'").fetchall()]
+
+def _seed_users(db, count, bureau_ids, rng):
+    # One password hash for everyone: hashing is deliberately slow.
+    password = generate_password_hash(PASSWORD)
+    supervisors = max(1, count // 10)
+    rows = [("bench_admin", password, "admin", bureau_ids[0], "Bench", "Admin", "B0", 1)]
+    for i in range(supervisors):
+        rows.append((f"bench_sup_{i}", password, "supervisor", rng.choice(bureau_ids), "Bench", "Sup", f"S{i}", 1))
+    for i in range(max(1, count - supervisors - 1)):
+        rows.append((f"bench_agent_{i}", password, "agent", rng.choice(bureau_ids), "Bench", "Agent", f"A{i}", 1))
+    db.executemany(
+        """
+        INSERT INTO users (username, password, role, bureau_id, prenom, nom, matricule, active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    return db.execute(
+        "SELECT id, bureau_id FROM users WHERE username LIKE 'bench_agent_%'"
+    ).fetchall()
+
+def _seed_reclamations(db, count, history_per, agents, type_ids, rng):
+    now = now_local()
+    statuts = [name for name, weight in STATUTS for _ in range(weight)]
+    ids = reclamation_store.reserve_ids(db, count)
+    rows = []
+    history = []
+    for reclamation_id in ids:
+        agent = rng.choice(agents)
+        created = now - timedelta(seconds=rng.randint(60, 365 * 86400))
+        statut = rng.choice(statuts)
+        archived = 1 if statut in ("TRAITEE", "REJETEE") and rng.random() < 0.5 else 0
+        updated = created + timedelta(hours=rng.randint(1, 72)) if statut != "EN_ATTENTE" else None
+        reminder_auto_at = None
+        if not archived and statut != "TRAITEE" and rng.random() < 0.05:
+            reminder_auto_at = _fmt(now - timedelta(minutes=rng.randint(1, 600)))
+        rows.append(
+            (
+                reclamation_id,
+                reclamation_store.dossier_number(reclamation_id, created),
+                agent["bureau_id"],
+                agent["id"],
+                rng.choice(type_ids),
+                str(rng.randint(10 ** 9, 10 ** 10 - 1)),
+                f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}",
+                f"03{rng.randint(2, 4)}{rng.randint(1000000, 9999999)}",
+                f"03{rng.randint(2, 4)}{rng.randint(1000000, 9999999)}",
+                "Campagne de mise a jour" if rng.random() < 0.3 else "",
+                statut,
+                archived,
+                _fmt(created),
+                _fmt(updated) if updated else None,
+                reminder_auto_at,
+            )
+        )
+        history.append((reclamation_id, None, "EN_ATTENTE", "Creation", agent["id"], _fmt(created)))
+        previous = "EN_ATTENTE"
+        for step in range(1, history_per):
+            current = statut if step == history_per - 1 else "EN_COURS"
+            history.append(
+                (reclamation_id, previous, current, "Traitement", agent["id"], _fmt(created + timedelta(hours=step)))
+            )
+            previous = current
+    for chunk in _chunks(rows):
+        db.copy_rows("reclamations", RECLAMATION_COLUMNS, chunk)
+        db.commit()
+    for chunk in _chunks(history):
+        db.copy_rows("historique_statut", reclamation_store.HISTORY_COLUMNS, chunk)
+        db.commit()
+    return ids
+
+def _seed_attachments(db, count, distinct, reclamation_ids, rng):
+    # Few distinct blobs shared by many pieces, as the deduplicating store does.
+    blobs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(min(distinct, count)):
+            path = os.path.join(tmp, f"piece_{i}.pdf")
+            with open(path, "wb") as out:
+                out.write(b"%PDF-1.4\n" + rng.randbytes(20000))
+            blobs.append(storage.save_file(path))
+    if not blobs:
+        return
+    refs = {}
+    rows = []
+    now = _fmt(now_local())
+    for i in range(count):
+        sha256, size = blobs[i % len(blobs)]
+        refs[sha256] = (size, refs.get(sha256, (size, 0))[1] + 1)
+        rows.append((rng.choice(reclamation_ids), f"{uuid4().hex}_piece_{i}.pdf", f"piece_{i}.pdf", now, sha256))
+    for chunk in _chunks(rows):
+        db.copy_rows("pieces_jointes", ("reclamation_id", "filename", "original_name", "uploaded_at", "sha256"), chunk)
+    db.executemany(
+        """
+        INSERT INTO blobs (sha256, size, ref_count, created_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (sha256) DO UPDATE SET ref_count = blobs.ref_count + EXCLUDED.ref_count
+        """,
+        [(sha256, size, refs_count, now) for sha256, (size, refs_count) in refs.items()],
+    )
+    db.commit()
+
+def seed(db, bureaux=50, users=200, reclamations=20000, history_per=3, attachments=2000, distinct_files=50, seed=1):
+    rng = random.Random(seed)
+    existing = db.execute("SELECT COUNT(*) AS n FROM reclamations").fetchone()["n"]
+    if existing:
+        raise RuntimeError(f"Refusing to seed a database that already holds {existing} reclamations.")
+    bureau_ids = _seed_bureaux(db, bureaux)
+    agents = _seed_users(db, users, bureau_ids, rng)
+    type_ids = [row["id"] for row in db.execute("SELECT id FROM types_reclamation WHERE actif = 1").fetchall()]
+    db.commit()
+    reclamation_ids = _seed_reclamations(db, reclamations, history_per, agents, type_ids, rng)
+    _seed_attachments(db, attachments, distinct_files, reclamation_ids, rng)
+    counters.rebuild(db)
+    db.commit()
+    refdata.invalidate()
@@ -0,0 +1,141 @@
+import csv
+import io
+import itertools
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+from database import get_db
+import refdata
+import reclamation_store
+
+# One reclamation per spreadsheet row. `type` accepts the code or the libelle,
+# `bureau` the code_bureau; an empty bureau falls back to the importer's own.
+COLUMNS = ("numero_compte", "nom_client", "type", "bureau", "ancienne_valeur", "nouvelle_valeur", "motif")
+REQUIRED_COLUMNS = ("numero_compte", "nom_client", "type")
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _header_key(value):
+    return _cell(value).lower().replace(" ", "_")
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    first = text.readline()
+    delimiter = ";" if first.count(";") >= first.count(",") else ","
+    yield from csv.reader(itertools.chain([first], text), delimiter=delimiter)
+
+def _xlsx_rows(stream):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def read_rows(stream, filename):
+    # Yields (line number, {column: value}) for each non-empty data row.
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "xlsx":
+        rows = _xlsx_rows(stream)
+    elif extension == "csv":
+        rows = _csv_rows(stream)
+    else:
+        raise ValueError("Format non supporte (CSV ou XLSX attendu).")
+    header = next(rows, None)
+    if not header:
+        raise ValueError("Fichier vide.")
+    keys = [_header_key(value) for value in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in keys]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}.")
+    for line, row in enumerate(rows, start=2):
+        values = {key: _cell(value) for key, value in zip(keys, row) if key in COLUMNS}
+        if any(values.values()):
+            yield line, values
+
+def _lookups():
+    by_label = {}
+    for row in refdata.types().rows:
+        if row["actif"] == 1:
+            by_label[row["code"].upper()] = row
+            by_label[(row["libelle"] or "").upper()] = row
+    return by_label, refdata.bureaux().by_code
+
+def validate(values, types_by_label, bureaux_by_code, default_bureau_id):
+    # Resolves the type and bureau labels, then applies the shared rules.
+    type_label = values.get("type", "")
+    type_row = types_by_label.get(type_label.upper()) if type_label else None
+    if type_label and not type_row:
+        return None, f"Type inconnu ou inactif : {type_label}."
+    bureau_code = values.get("bureau", "")
+    if bureau_code:
+        bureau = bureaux_by_code.get(bureau_code)
+        if not bureau:
+            return None, f"Bureau inconnu : {bureau_code}."
+        bureau_id = bureau["id"]
+    else:
+        bureau_id = default_bureau_id
+    return reclamation_store.validate(
+        dict(values, type_id=type_row["id"] if type_row else None),
+        bureau_id,
+    )
+
+def import_rows(db, rows, user_id, default_bureau_id):
+    # Valid rows are inserted and committed IMPORT_CHUNK_SIZE at a time;
+    # invalid ones are skipped and reported with their line number.
+    types_by_label, bureaux_by_code = _lookups()
+    result = {"created": 0, "error_count": 0, "errors": [], "first": None, "last": None}
+    chunk = []
+
+    def flush():
+        created = reclamation_store.insert_reclamations(db, chunk, user_id)
+        db.commit()
+        chunk.clear()
+        if created:
+            result["created"] += len(created)
+            result["first"] = result["first"] or created[0]["numero_dossier"]
+            result["last"] = created[-1]["numero_dossier"]
+
+    for line, values in rows:
+        entry, error = validate(values, types_by_label, bureaux_by_code, default_bureau_id)
+        if error:
+            result["error_count"] += 1
+            if len(result["errors"]) < IMPORT_MAX_ERRORS:
+                result["errors"].append((line, error))
+            continue
+        chunk.append(entry)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush()
+    flush()
+    return result
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) != 4 or sys.argv[2] != "--user":
+        print("Usage: python bulk_import.py <fichier.csv|fichier.xlsx> --user <username>")
+        sys.exit(1)
+    path, username = sys.argv[1], sys.argv[3]
+    with get_db() as db:
+        user = db.execute("SELECT id, bureau_id FROM users WHERE username = ?", (username,)).fetchone()
+        if not user:
+            print(f"Utilisateur inconnu : {username}")
+            sys.exit(1)
+        started = time.monotonic()
+        with open(path, "rb") as stream:
+            try:
+                result = import_rows(db, read_rows(stream, path), user["id"], user["bureau_id"])
+            except ValueError as exc:
+                print(exc)
+                sys.exit(1)
+    for line, error in result["errors"]:
+        print(f"Ligne {line}: {error}")
+    print(
+        f"{result['created']} reclamation(s) importee(s), {result['error_count']} ligne(s) rejetee(s) "
+        f"en {time.monotonic() - started:.1f}s."
+    )
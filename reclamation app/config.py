@@ -4,8 +4,94 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 SECRET_KEY = "MYTSINJO_SECRET_KEY"
 DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
-DATABASE_PATH = os.path.join(BASE_DIR, "reclamation.db")
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(BASE_DIR, "reclamation.db"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+# Optional PostgreSQL read replica for GET requests, exports and the reminder
+# schedule. It is skipped while it lags more than DB_REPLICA_MAX_LAG_SECONDS,
+# and a session that just wrote reads from the primary for that long.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "").strip()
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "2"))
+# statement_timeout on replica connections; a replica that stops answering
+# altogether is given up on a few seconds later (socket timeout).
+DB_REPLICA_TIMEOUT_SECONDS = float(os.getenv("DB_REPLICA_TIMEOUT_SECONDS", "30"))
+# SQLite only: WAL lets readers run alongside the single writer; writers take
+# turns in-process and wait at most SQLITE_WRITE_TIMEOUT seconds for their turn.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_WRITE_TIMEOUT = float(os.getenv("SQLITE_WRITE_TIMEOUT", "10"))
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(BASE_DIR, "uploads"))
 
 ALLOWED_EXTENSIONS = {"pdf", "jpg", "jpeg", "png"}
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# "" streams attachments from Python; "x-sendfile" (Apache, lighttpd) or
+# "x-accel" (nginx, with DOWNLOAD_ACCEL_PREFIX as an internal location
+# aliased to UPLOAD_FOLDER) hands the transfer to the front proxy.
+DOWNLOAD_OFFLOAD = os.getenv("DOWNLOAD_OFFLOAD", "").strip().lower()
+DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "/protected-uploads/")
+DOWNLOAD_MAX_AGE = int(os.getenv("DOWNLOAD_MAX_AGE", "3600"))
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_DISPLAY_MAX = int(os.getenv("IMAGE_DISPLAY_MAX", "1600"))
+IMAGE_THUMB_MAX = int(os.getenv("IMAGE_THUMB_MAX", "240"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))
+DASHBOARD_MAX_PAGE_SIZE = int(os.getenv("DASHBOARD_MAX_PAGE_SIZE", "200"))
+DASHBOARD_TOTAL_COUNT = os.getenv("DASHBOARD_TOTAL_COUNT", "1") == "1"
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CSV_DELIMITER = os.getenv("EXPORT_CSV_DELIMITER", ";")
+API_BATCH_MAX = int(os.getenv("API_BATCH_MAX", "500"))
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "200"))
+MIGRATE_CHUNK_SIZE = int(os.getenv("MIGRATE_CHUNK_SIZE", "10000"))
+MIGRATE_WORKERS = int(os.getenv("MIGRATE_WORKERS", "3"))
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "120"))
+
+DB_SLOW_QUERY_SECONDS = float(os.getenv("DB_SLOW_QUERY_SECONDS", "0.2"))
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "100"))
+METRICS_MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", "500"))
+# Server-Timing on every response; admins always get it.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+# Fraction of requests run under cProfile (0 disables); tracemalloc is optional.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+REFDATA_TTL_SECONDS = float(os.getenv("REFDATA_TTL_SECONDS", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+EVENTS_BACKLOG = int(os.getenv("EVENTS_BACKLOG", "1000"))
+EVENTS_STREAM_SECONDS = float(os.getenv("EVENTS_STREAM_SECONDS", "300"))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+EVENTS_LONG_POLL_SECONDS = float(os.getenv("EVENTS_LONG_POLL_SECONDS", "25"))
+# Events are pushed in-process: with one worker process staff see every write
+# live. With several, set this (e.g. 15) so each worker also reads the shared
+# pending counters and announces what grew in another worker; agents' status
+# toasts still only come from their own worker.
+EVENTS_COUNTER_POLL_SECONDS = float(os.getenv("EVENTS_COUNTER_POLL_SECONDS", "0"))
+
+# 0 disables the periodic reload of the reminder schedule from the database.
+REMINDER_RESYNC_SECONDS = float(os.getenv("REMINDER_RESYNC_SECONDS", "3600"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+# Delay before due reminders are retried after a failed processing batch.
+REMINDER_RETRY_SECONDS = float(os.getenv("REMINDER_RETRY_SECONDS", "60"))
+
+# Comma-separated list among: toast, log, webhook.
+NOTIFY_SINKS = [s.strip() for s in os.getenv("NOTIFY_SINKS", "toast").split(",") if s.strip()]
+NOTIFY_WEBHOOK_URL = os.getenv("NOTIFY_WEBHOOK_URL", "").strip()
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "1000"))
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "1"))
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "1"))
+NOTIFY_DELAY_WARN_SECONDS = float(os.getenv("NOTIFY_DELAY_WARN_SECONDS", "5"))
@@ -0,0 +1,103 @@
+from database import get_db
+
+# Counters are bumped in the same transaction as the write they describe.
+# `python counters.py rebuild` recomputes them from the tables to repair drift.
+STATUTS = ["EN_ATTENTE", "EN_COURS", "TRAITEE", "REJETEE"]
+
+def status_key(statut):
+    return f"status:{statut}"
+
+def bureau_key(bureau_id):
+    return f"bureau:{bureau_id}"
+
+def bump(db, deltas):
+    rows = [(name, delta) for name, delta in deltas.items() if delta]
+    if not rows:
+        return
+    db.executemany(
+        """
+        INSERT INTO counters (name, value) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET value = counters.value + EXCLUDED.value
+        """,
+        rows,
+    )
+
+def get_counts(db, names=None):
+    if names is None:
+        rows = db.execute("SELECT name, value FROM counters").fetchall()
+    else:
+        names = list(names)
+        if not names:
+            return {}
+        placeholders = ", ".join(["?"] * len(names))
+        rows = db.execute(
+            f"SELECT name, value FROM counters WHERE name IN ({placeholders})",
+            names,
+        ).fetchall()
+    counts = {name: 0 for name in names or []}
+    counts.update({row["name"]: row["value"] for row in rows})
+    return counts
+
+def reclamation_created(bureau_id, count=1):
+    deltas = {
+        "reclamations": count,
+        "pending_reclamations": count,
+        status_key("EN_ATTENTE"): count,
+    }
+    if bureau_id:
+        deltas[bureau_key(bureau_id)] = count
+    return deltas
+
+def status_changed(old_statut, new_statut, archived):
+    deltas = {}
+    if old_statut != new_statut:
+        deltas[status_key(old_statut)] = -1
+        deltas[status_key(new_statut)] = 1
+        if not archived:
+            deltas["pending_reclamations"] = (new_statut == "EN_ATTENTE") - (old_statut == "EN_ATTENTE")
+    return deltas
+
+def user_activity_changed(old_active, new_active):
+    return {"pending_users": (new_active == 0) - (old_active == 0)}
+
+def rebuild(db):
+    db.execute("DELETE FROM counters")
+    db.execute(
+        """
+        INSERT INTO counters (name, value)
+        SELECT 'users', COUNT(*) FROM users
+        UNION ALL SELECT 'pending_users', COUNT(*) FROM users WHERE active = 0
+        UNION ALL SELECT 'bureaux', COUNT(*) FROM bureaux
+        UNION ALL SELECT 'types', COUNT(*) FROM types_reclamation
+        UNION ALL SELECT 'reclamations', COUNT(*) FROM reclamations
+        UNION ALL SELECT 'pending_reclamations', COUNT(*) FROM reclamations
+            WHERE statut = 'EN_ATTENTE' AND archived = 0
+        """
+    )
+    db.execute(
+        """
+        INSERT INTO counters (name, value)
+        SELECT 'status:' || statut, COUNT(*) FROM reclamations
+        WHERE statut IS NOT NULL
+        GROUP BY statut
+        """
+    )
+    db.execute(
+        """
+        INSERT INTO counters (name, value)
+        SELECT 'bureau:' || CAST(bureau_id AS TEXT), COUNT(*) FROM reclamations
+        WHERE bureau_id IS NOT NULL
+        GROUP BY bureau_id
+        """
+    )
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python counters.py rebuild")
+        sys.exit(1)
+    with get_db() as db:
+        rebuild(db)
+        db.commit()
+    print("Counters rebuilt.")
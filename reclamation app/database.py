@@ -1,7 +1,30 @@
+import io
 import os
 import ssl
 import sqlite3
-from config import DATABASE_PATH, DATABASE_URL
+import threading
+import time
+from uuid import uuid4
+from flask import g, has_app_context, has_request_context, request, session
+from config import (
+    DATABASE_PATH,
+    DATABASE_URL,
+    DATABASE_REPLICA_URL,
+    DB_REPLICA_MAX_LAG_SECONDS,
+    DB_REPLICA_CHECK_SECONDS,
+    DB_REPLICA_TIMEOUT_SECONDS,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_HEALTHCHECK_SECONDS,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_WRITE_TIMEOUT,
+)
+from metrics import record_query
 
 _USE_POSTGRES = DATABASE_URL.startswith("postgres://") or DATABASE_URL.startswith("postgresql://")
 
@@ -15,27 +38,151 @@ def _translate_params(sql):
     # Convert SQLite-style placeholders to psycopg2 style.
     return sql.replace("?", "%s") if _USE_POSTGRES else sql
 
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "BEGIN", "CREATE", "DROP", "ALTER")
+
+def _is_write(sql):
+    return sql.lstrip()[:8].upper().startswith(_WRITE_VERBS)
+
+def _needs_primary(sql):
+    # Statements a hot standby refuses, besides plain writes.
+    upper = sql.upper()
+    return _is_write(sql) or "NEXTVAL(" in upper or "FOR UPDATE" in upper
+
 class DBConn:
-    def __init__(self, conn):
+    def __init__(self, conn, pool=None, request_scoped=False, replica=False):
         self.conn = conn
+        self._pool = pool
+        self._request_scoped = request_scoped
+        self._replica = replica
+        self._writing = False
+
+    def _route(self, sql=None):
+        # A replica connection moves to the primary at the first statement the
+        # replica cannot run; every later read then sees that write.
+        if not self._replica or (sql is not None and not _needs_primary(sql)):
+            return
+        self.use_primary()
+        if has_request_context():
+            g._db_wrote = True
+
+    def use_primary(self):
+        if not self._replica:
+            return
+        replica_conn, replica_pool = self.conn, self._pool
+        self.conn = _pool.acquire()
+        self._pool = _pool
+        self._replica = False
+        replica_pool.release(replica_conn)
+
+    def _begin_write(self, sql):
+        # SQLite has one writer per database: wait for our turn before the
+        # first write statement, and keep it until the transaction ends.
+        if not _USE_POSTGRES and not self._writing and _is_write(sql):
+            _write_queue.acquire()
+            self._writing = True
+
+    def _end_write(self):
+        if self._writing:
+            self._writing = False
+            _write_queue.release()
+
+    def _check_write(self):
+        # Autocommitted statements (DDL, executescript) leave no transaction open.
+        if self._writing and not self.conn.in_transaction:
+            self._end_write()
 
     def execute(self, sql, params=None):
         if _USE_POSTGRES:
-            cur = self.conn.cursor()
-            cur.execute(_translate_params(sql), params or ())
-            return PgCursor(cur)
-        return self.conn.execute(sql, params or ())
+            self._route(sql)
+            started = time.perf_counter()
+            try:
+                cur = self.conn.cursor()
+                cur.execute(_translate_params(sql), params or ())
+                return PgCursor(cur)
+            finally:
+                record_query(sql, started)
+        self._begin_write(sql)
+        started = time.perf_counter()
+        try:
+            return self.conn.execute(sql, params or ())
+        finally:
+            record_query(sql, started)
+            self._check_write()
 
     def executemany(self, sql, seq_of_params):
         if _USE_POSTGRES:
+            self._route(sql)
+            started = time.perf_counter()
+            try:
+                cur = self.conn.cursor()
+                cur.executemany(_translate_params(sql), seq_of_params)
+                return PgCursor(cur)
+            finally:
+                record_query(sql, started)
+        self._begin_write(sql)
+        started = time.perf_counter()
+        try:
+            return self.conn.executemany(sql, seq_of_params)
+        finally:
+            record_query(sql, started)
+            self._check_write()
+
+    def iter_batches(self, sql, params=None, size=1000):
+        # Yields lists of rows without loading the whole result: a server-side
+        # cursor on Postgres (pg8000 buffers plain results), fetchmany on SQLite.
+        if not _USE_POSTGRES:
+            cur = self.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    return
+                yield rows
+        name = f"batch_{uuid4().hex}"
+        cur = self.conn.cursor()
+        cur.execute(f"DECLARE {name} NO SCROLL CURSOR FOR {_translate_params(sql)}", params or ())
+        rows_cursor = PgCursor(cur)
+        try:
+            while True:
+                # Each FETCH is where the server does the work; recorded under
+                # the query itself rather than the per-export cursor name.
+                started = time.perf_counter()
+                cur.execute(f"FETCH FORWARD {int(size)} FROM {name}")
+                record_query(sql, started)
+                rows = rows_cursor.fetchall()
+                if not rows:
+                    return
+                yield rows
+        finally:
+            try:
+                cur.execute(f"CLOSE {name}")
+            except Exception:
+                pass
+
+    def copy_rows(self, table, columns, rows):
+        # Bulk load: COPY FROM STDIN on Postgres, executemany on SQLite.
+        if not _USE_POSTGRES:
+            placeholders = ", ".join(["?"] * len(columns))
+            return self.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                rows,
+            )
+        self._route()
+        started = time.perf_counter()
+        try:
             cur = self.conn.cursor()
-            cur.executemany(_translate_params(sql), seq_of_params)
+            pg_copy(cur, table, columns, rows)
             return PgCursor(cur)
-        return self.conn.executemany(sql, seq_of_params)
+        finally:
+            record_query(f"COPY {table} ({', '.join(columns)}) FROM STDIN", started)
 
     def executescript(self, script):
         if not _USE_POSTGRES:
-            return self.conn.executescript(script)
+            self._begin_write("BEGIN")
+            try:
+                return self.conn.executescript(script)
+            finally:
+                self._check_write()
+        self._route()
         cur = self.conn.cursor()
         statements = [s.strip() for s in script.split(";") if s.strip()]
         for stmt in statements:
@@ -44,54 +191,458 @@ class DBConn:
 
     def cursor(self):
         if _USE_POSTGRES:
+            self._route()
             return PgCursor(self.conn.cursor())
         return self.conn.cursor()
 
     def commit(self):
-        return self.conn.commit()
+        try:
+            return self.conn.commit()
+        except Exception:
+            # A failed COMMIT leaves the transaction, and SQLite's write lock,
+            # open: undo it before the next writer gets its turn.
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self._end_write()
+
+    def rollback(self):
+        try:
+            return self.conn.rollback()
+        finally:
+            self._end_write()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Caller-owned connections go back to the pool on every exit path,
+        # rolled back when the block failed; the request's own connection
+        # stays open until teardown.
+        if exc_type is not None and self.conn is not None:
+            try:
+                self.rollback()
+            except Exception:
+                pass
+        self.close()
+        return False
 
     def close(self):
-        return self.conn.close()
+        # The request-scoped connection is handed back on teardown, so routes
+        # can keep calling close() after each block of work.
+        if self._request_scoped:
+            return None
+        return self.release()
+
+    def release(self):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return None
+        try:
+            if self._pool is None:
+                return conn.close()
+            return self._pool.release(conn)
+        finally:
+            # The pool rolled back anything left uncommitted.
+            self._end_write()
+
+def _copy_field(value):
+    # COPY csv: an unquoted empty field is NULL, a quoted one is a string.
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+def pg_copy(cur, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_copy_field(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.execute(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        stream=buffer,
+    )
+    return cur.rowcount
 
-def get_db():
+def _connect(url=DATABASE_URL, timeout=None):
     if _USE_POSTGRES:
         sslmode = os.getenv("DB_SSLMODE", "prefer").lower()
         ssl_context = None
         if sslmode in ["require", "verify-full", "verify-ca"]:
             ssl_context = ssl.create_default_context()
-        conn = pg8000.connect(DATABASE_URL, ssl_context=ssl_context)
-        return DBConn(conn)
-    conn = sqlite3.connect(DATABASE_PATH)
+        return pg8000.connect(url, ssl_context=ssl_context, timeout=timeout)
+    # Pooled connections move between request threads and the reminder worker,
+    # but only one thread uses a given connection at a time. IMMEDIATE takes
+    # the database write lock when a write transaction starts, so another
+    # process's writer is waited for (busy timeout) instead of failing mid-way.
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        isolation_level="IMMEDIATE",
+    )
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
-    return DBConn(conn)
+    conn.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size = {-int(SQLITE_CACHE_SIZE_KB)}")
+    return conn
+
+class WriteQueue:
+    # Writers take turns in arrival order: one SQLite write transaction at a
+    # time per process, readers untouched (WAL), and a bounded wait.
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self._waiting = 0
+        self._writes = 0
+        self._timeouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._waiting += 1
+            try:
+                while self._serving != ticket:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._abandoned.add(ticket)
+                        self._timeouts += 1
+                        raise RuntimeError("Database write queue timed out.")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - started
+            self._writes += 1
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+
+    def release(self):
+        with self._cond:
+            self._serving += 1
+            while self._serving in self._abandoned:
+                self._abandoned.remove(self._serving)
+                self._serving += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "writes": self._writes,
+                "waiting": self._waiting,
+                "timeouts": self._timeouts,
+                "wait_seconds": round(self._wait_seconds, 6),
+                "max_wait_seconds": round(self._max_wait_seconds, 6),
+            }
+
+_write_queue = WriteQueue(SQLITE_WRITE_TIMEOUT)
+
+def write_queue_stats():
+    return _write_queue.stats()
+
+class ConnectionPool:
+    def __init__(self, connect, size, timeout, idle_timeout, healthcheck_seconds):
+        self._connect = connect
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.healthcheck_seconds = healthcheck_seconds
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError("Database connection pool exhausted.")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                else:
+                    conn, released_at = None, None
+                    self._open += 1
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._discard(None)
+                    raise
+
+            idle_for = time.monotonic() - released_at
+            if self.idle_timeout and idle_for > self.idle_timeout:
+                self._discard(conn)
+                continue
+            if idle_for > self.healthcheck_seconds and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def release(self, conn):
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.size, "open": self._open, "idle": len(self._idle)}
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def _is_healthy(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchall()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+_pool = ConnectionPool(
+    _connect,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_HEALTHCHECK_SECONDS,
+)
+
+def _connect_replica():
+    # Neither a slow query nor a hung replica may hold a request for long.
+    conn = _connect(DATABASE_REPLICA_URL, timeout=DB_REPLICA_TIMEOUT_SECONDS + 5)
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SET statement_timeout = {int(DB_REPLICA_TIMEOUT_SECONDS * 1000)}")
+        conn.commit()
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+_replica_pool = None
+if DATABASE_REPLICA_URL:
+    if _USE_POSTGRES:
+        _replica_pool = ConnectionPool(
+            _connect_replica,
+            DB_POOL_SIZE,
+            DB_POOL_TIMEOUT,
+            DB_POOL_IDLE_TIMEOUT,
+            DB_POOL_HEALTHCHECK_SECONDS,
+        )
+    else:
+        print("[DB] DATABASE_REPLICA_URL ignored: read replicas need PostgreSQL.")
+
+_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+_replica_lock = threading.Lock()
+_replica_state = {"checked_at": None, "healthy": False, "lag_seconds": None, "reads": 0, "fallbacks": 0}
+
+def _check_replica():
+    lag = None
+    try:
+        conn = _replica_pool.acquire()
+        try:
+            cur = conn.cursor()
+            cur.execute(_REPLICA_LAG_SQL)
+            lag = float(cur.fetchone()[0])
+        finally:
+            _replica_pool.release(conn)
+    except Exception as exc:
+        print(f"[DB] replica check failed: {exc}")
+    with _replica_lock:
+        _replica_state["lag_seconds"] = lag
+        _replica_state["healthy"] = lag is not None and lag <= DB_REPLICA_MAX_LAG_SECONDS
+
+def _replica_usable():
+    # The lag is measured at most every DB_REPLICA_CHECK_SECONDS, by whichever
+    # thread finds it stale. Until that check succeeds the replica counts as
+    # unhealthy, so a hanging probe sends the other requests to the primary.
+    now = time.monotonic()
+    with _replica_lock:
+        checked_at = _replica_state["checked_at"]
+        stale = checked_at is None or now - checked_at >= DB_REPLICA_CHECK_SECONDS
+        if stale:
+            _replica_state["checked_at"] = now
+            _replica_state["healthy"] = False
+    if stale:
+        _check_replica()
+    with _replica_lock:
+        usable = _replica_state["healthy"]
+        _replica_state["reads" if usable else "fallbacks"] += 1
+    return usable
+
+def _read_only_request():
+    # GET pages and polls, unless this session wrote within the lag window.
+    return (
+        has_request_context()
+        and request.method in ("GET", "HEAD")
+        and session.get("db_primary_until", 0) < time.time()
+    )
+
+def _open(readonly, request_scoped=False):
+    if readonly and _replica_pool is not None and _replica_usable():
+        try:
+            return DBConn(_replica_pool.acquire(), _replica_pool, request_scoped, replica=True)
+        except Exception as exc:
+            print(f"[DB] replica unavailable, using primary: {exc}")
+            with _replica_lock:
+                _replica_state["fallbacks"] += 1
+    return DBConn(_pool.acquire(), _pool, request_scoped)
+
+def pool_stats():
+    return _pool.stats()
+
+def replica_stats():
+    if _replica_pool is None:
+        return {"enabled": 0}
+    with _replica_lock:
+        state = dict(_replica_state)
+    return dict(
+        _replica_pool.stats(),
+        enabled=1,
+        healthy=int(state["healthy"]),
+        lag_seconds=state["lag_seconds"],
+        reads=state["reads"],
+        fallbacks=state["fallbacks"],
+    )
+
+def connect_db(readonly=False):
+    # A pooled connection owned by the caller even inside a request, for work
+    # that outlives it (streamed responses, background threads). readonly
+    # allows the replica; a write still moves it to the primary.
+    return _open(readonly)
+
+def get_db(readonly=False, primary=False):
+    # Inside Flask, every get_db() call shares one connection for the request,
+    # on the replica for read-only requests. Outside (init_db, reminder
+    # worker), the caller owns it until close(). primary=True is for cache
+    # refills: a lagging replica would keep stale rows cached for the TTL.
+    if has_app_context():
+        db = g.get("_db")
+        if db is None:
+            db = g._db = _open(_read_only_request() and not primary, request_scoped=True)
+        elif primary:
+            db.use_primary()
+        return db
+    return _open(readonly and not primary)
+
+def close_request_db(exc=None):
+    db = g.pop("_db", None)
+    if db is not None:
+        db.release()
+
+def _remember_primary(response):
+    # Read-your-writes: after a write, this session skips the replica until
+    # it has had time to catch up.
+    if _replica_pool is not None and (request.method not in ("GET", "HEAD") or g.pop("_db_wrote", False)):
+        session["db_primary_until"] = time.time() + DB_REPLICA_MAX_LAG_SECONDS
+    return response
+
+def init_app(app):
+    app.after_request(_remember_primary)
+    app.teardown_appcontext(close_request_db)
+
+class Row:
+    # PostgreSQL rows with the sqlite3.Row interface SQLite connections use:
+    # row["col"], row[0], keys(), dict(row). The column index is built once
+    # per cursor, not per row.
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._values[key]
+        return self._values[self._index[key]]
+
+    def keys(self):
+        return list(self._index)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            return self._index.keys() == other._index.keys() and self._values == other._values
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Row({dict(zip(self._index, self._values))!r})"
+
+def _column_index(description):
+    return {column[0]: position for position, column in enumerate(description)}
 
 class PgCursor:
     def __init__(self, cursor):
         self._cursor = cursor
+        self._index = None
 
     @property
     def description(self):
         return self._cursor.description
 
+    def _row(self, values):
+        if self._index is None:
+            self._index = _column_index(self._cursor.description)
+        return Row(self._index, values)
+
     def fetchone(self):
         row = self._cursor.fetchone()
-        return _row_to_dict(self._cursor, row)
+        return None if row is None else self._row(row)
 
     def fetchall(self):
-        rows = self._cursor.fetchall()
-        return [_row_to_dict(self._cursor, row) for row in rows]
+        return [self._row(row) for row in self._cursor.fetchall()]
 
     def fetchmany(self, size=None):
-        rows = self._cursor.fetchmany(size)
-        return [_row_to_dict(self._cursor, row) for row in rows]
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
 
     def __iter__(self):
         for row in self._cursor:
-            yield _row_to_dict(self._cursor, row)
-
-def _row_to_dict(cursor, row):
-    if row is None:
-        return None
-    cols = [d[0] for d in cursor.description]
-    return dict(zip(cols, row))
+            yield self._row(row)
@@ -0,0 +1,195 @@
+import json
+import threading
+import time
+from collections import deque
+from flask import Blueprint, Response, request, jsonify
+from flask_login import login_required, current_user
+from database import close_request_db, connect_db
+from config import (
+    EVENTS_BACKLOG,
+    EVENTS_STREAM_SECONDS,
+    EVENTS_KEEPALIVE_SECONDS,
+    EVENTS_LONG_POLL_SECONDS,
+    EVENTS_COUNTER_POLL_SECONDS,
+)
+import counters
+
+events_bp = Blueprint("events", __name__)
+
+STAFF_ROLES = ("admin", "supervisor")
+
+class EventBroker:
+    # In-process only: each worker process pushes the writes it committed
+    # itself (see CounterWatcher for the others).
+    def __init__(self, backlog):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=backlog)
+        self._last_id = 0
+
+    def publish(self, kind, data, roles=(), user_id=None):
+        with self._cond:
+            self._last_id += 1
+            self._events.append(
+                {
+                    "id": self._last_id,
+                    "type": kind,
+                    "data": data,
+                    "roles": tuple(roles),
+                    "user_id": str(user_id) if user_id is not None else None,
+                }
+            )
+            self._cond.notify_all()
+
+    def last_id(self):
+        with self._cond:
+            return self._last_id
+
+    def wait(self, since, timeout):
+        # Returns (events after `since`, whether some were already evicted).
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._last_id <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], False
+                self._cond.wait(remaining)
+            missed = bool(self._events) and self._events[0]["id"] > since + 1
+            return [e for e in self._events if e["id"] > since], missed
+
+broker = EventBroker(EVENTS_BACKLOG)
+
+class CounterWatcher:
+    # Multi-worker fallback: growth of the shared pending counters that this
+    # process did not publish itself came from another worker, and is
+    # announced here like the old count poll did.
+    KINDS = {
+        "pending_reclamations": ("reclamation_created", STAFF_ROLES),
+        "pending_users": ("user_registered", ("admin",)),
+    }
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._lock = threading.Lock()
+        self._local = {name: 0 for name in self.KINDS}
+        self._last = None
+
+    def published(self, data):
+        with self._lock:
+            for name in self.KINDS:
+                self._local[name] += data.get(name, 0)
+
+    def check(self, counts):
+        # Local totals are read after the counters: a write published here is
+        # committed before it is published, so it is never taken as remote.
+        with self._lock:
+            local = dict(self._local)
+        last, self._last = self._last, (counts, local)
+        if last is None:
+            return
+        for name, (kind, roles) in self.KINDS.items():
+            remote = (counts[name] - last[0][name]) - (local[name] - last[1][name])
+            if remote > 0:
+                self.broker.publish(kind, {name: remote}, roles=roles)
+
+watcher = CounterWatcher(broker)
+_watcher_thread = None
+_watcher_lock = threading.Lock()
+
+def _watch_counters():
+    while True:
+        try:
+            with connect_db() as db:
+                counts = counters.get_counts(db, CounterWatcher.KINDS)
+            watcher.check(counts)
+        except Exception as exc:
+            print(f"[EVENTS] counter poll failed: {exc}")
+        time.sleep(EVENTS_COUNTER_POLL_SECONDS)
+
+def _start_watcher():
+    global _watcher_thread
+    if EVENTS_COUNTER_POLL_SECONDS <= 0 or _watcher_thread is not None:
+        return
+    with _watcher_lock:
+        if _watcher_thread is None:
+            _watcher_thread = threading.Thread(target=_watch_counters, daemon=True)
+            _watcher_thread.start()
+
+def publish(kind, data, roles=(), user_id=None):
+    watcher.published(data)
+    broker.publish(kind, data, roles=roles, user_id=user_id)
+
+def _visible(event, role, user_id):
+    return role in event["roles"] or event["user_id"] == user_id
+
+def _next_events(since, role, user_id, timeout):
+    last_id = broker.last_id()
+    if since > last_id:
+        # The process restarted since the client last connected.
+        return [{"id": last_id, "type": "resync", "data": {}}], last_id
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return [], since
+        events, missed = broker.wait(since, remaining)
+        if not events:
+            return [], since
+        since = events[-1]["id"]
+        visible = [
+            {"id": e["id"], "type": e["type"], "data": e["data"]}
+            for e in events
+            if _visible(e, role, user_id)
+        ]
+        if missed:
+            visible.insert(0, {"id": since, "type": "resync", "data": {}})
+        if visible:
+            return visible, since
+
+def _parse_since(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+@events_bp.route("/events/stream", methods=["GET"])
+@login_required
+def stream():
+    _start_watcher()
+    since = _parse_since(request.headers.get("Last-Event-ID"))
+    if since is None:
+        since = broker.last_id()
+    role = current_user.role
+    user_id = str(current_user.id)
+
+    # Not wrapped in stream_with_context: the request context (and its pooled
+    # database connection) is released before the stream starts.
+    def generate(since):
+        yield "retry: 3000\n\n"
+        deadline = time.monotonic() + EVENTS_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            events, since = _next_events(since, role, user_id, EVENTS_KEEPALIVE_SECONDS)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                yield f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(
+        generate(since),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@events_bp.route("/events/poll", methods=["GET"])
+@login_required
+def poll():
+    _start_watcher()
+    since = _parse_since(request.args.get("since"))
+    if since is None:
+        return jsonify({"events": [], "last_id": broker.last_id()})
+    role = current_user.role
+    user_id = str(current_user.id)
+    # Don't hold a pooled connection while parked.
+    close_request_db()
+    events, last_id = _next_events(since, role, user_id, EVENTS_LONG_POLL_SECONDS)
+    return jsonify({"events": events, "last_id": last_id})
@@ -0,0 +1,87 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+from config import UPLOAD_FOLDER, IMAGE_WORKERS, IMAGE_DISPLAY_MAX, IMAGE_THUMB_MAX, IMAGE_JPEG_QUALITY
+import storage
+
+try:
+    from PIL import Image, ImageOps
+except Exception:  # pragma: no cover - optional dependency
+    Image = None
+
+# Raised by get_variant for uploads Pillow cannot decode (UnidentifiedImageError
+# is an OSError).
+DECODE_ERRORS = (OSError, Image.DecompressionBombError) if Image else (OSError,)
+
+# Derived copies of image attachments, cached next to the blob store under
+# derived/ab/<sha256>_<variant>.jpg. Originals are never modified.
+DERIVED_DIR = os.path.join(UPLOAD_FOLDER, "derived")
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png"}
+VARIANTS = {
+    "display": IMAGE_DISPLAY_MAX,
+    "thumb": IMAGE_THUMB_MAX,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def is_image(filename):
+    return "." in (filename or "") and filename.rsplit(".", 1)[1].lower() in IMAGE_EXTENSIONS
+
+def available():
+    return Image is not None
+
+def derived_path(sha256, variant):
+    return os.path.join(DERIVED_DIR, sha256[:2], f"{sha256}_{variant}.jpg")
+
+def _render(source, sha256, variant, max_size):
+    path = derived_path(sha256, variant)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    image = ImageOps.exif_transpose(source)
+    image.thumbnail((max_size, max_size))
+    if image.mode != "RGB":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.split()[-1])
+        image = background
+    tmp_path = f"{path}.{uuid4().hex}.tmp"
+    image.save(tmp_path, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+    return path
+
+def process(sha256):
+    if not available():
+        return None
+    source_path = storage.blob_path(sha256)
+    if not os.path.isfile(source_path):
+        return None
+    with Image.open(source_path) as source:
+        source.load()
+        return {variant: _render(source, sha256, variant, size) for variant, size in VARIANTS.items()}
+
+def _process_logged(sha256):
+    try:
+        process(sha256)
+    except Exception as exc:
+        print(f"[IMAGES] {sha256}: {exc}")
+
+def submit(sha256):
+    global _executor
+    if not available():
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="images")
+    _executor.submit(_process_logged, sha256)
+
+def get_variant(sha256, variant):
+    # Falls back to rendering inline when the pool has not caught up yet, or
+    # for pieces uploaded before this pipeline existed.
+    path = derived_path(sha256, variant)
+    if os.path.exists(path):
+        return path
+    rendered = process(sha256)
+    return rendered.get(variant) if rendered else None
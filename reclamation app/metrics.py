@@ -0,0 +1,291 @@
+import re
+import threading
+from bisect import bisect_left
+import time
+from collections import deque
+from functools import lru_cache
+from flask import g, has_app_context, has_request_context, request, before_render_template, template_rendered
+from flask_login import current_user
+from config import METRICS_MAX_STATEMENTS, DB_SLOW_QUERY_SECONDS, DB_SLOW_QUERY_LOG_SIZE, SERVER_TIMING
+
+# In-process only, like the event broker: each worker reports what it served.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        # Interpolated inside the bucket holding the rank; the overflow bucket
+        # is capped by the largest value seen.
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for position, count in enumerate(self.buckets):
+            upper = self.bounds[position] if position < len(self.bounds) else self.max
+            if count and seen + count >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": round(self.percentile(0.50), 6),
+            "p95": round(self.percentile(0.95), 6),
+            "p99": round(self.percentile(0.99), 6),
+        }
+
+_NUMBER_RE = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r"IN \((\?(, )?)+\)", re.IGNORECASE)
+_VALUES_RE = re.compile(r"VALUES (\((\?(, )?)+\)(, )?)+", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    # Same statement shape, same key: literals and IN lists are folded.
+    sql = _SPACE_RE.sub(" ", sql).strip()
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _VALUES_RE.sub("VALUES (...)", sql)
+    return _IN_LIST_RE.sub("IN (...)", sql)
+
+class QueryMetrics:
+    def __init__(self, max_statements, slow_seconds, slow_log_size):
+        self.max_statements = max_statements
+        self.slow_seconds = slow_seconds
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._endpoints = {}
+        self._slow = deque(maxlen=slow_log_size)
+
+    def record(self, sql, seconds):
+        key = normalize_sql(sql)
+        with self._lock:
+            histogram = self._statements.get(key)
+            if histogram is None:
+                if len(self._statements) >= self.max_statements:
+                    key = "(other)"
+                    histogram = self._statements.get(key)
+                if histogram is None:
+                    histogram = self._statements[key] = Histogram()
+            histogram.observe(seconds)
+            if self.slow_seconds and seconds >= self.slow_seconds:
+                endpoint = request.endpoint if has_request_context() else None
+                self._slow.append(
+                    {
+                        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "seconds": round(seconds, 6),
+                        "endpoint": endpoint,
+                        "sql": key,
+                    }
+                )
+                print(f"[SLOW SQL] {seconds:.3f}s {endpoint or '-'}: {key[:200]}")
+
+    def record_request(self, endpoint, queries, seconds):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "requests": 0,
+                    "queries": 0,
+                    "max_queries": 0,
+                    "query_seconds": Histogram(),
+                }
+            entry["requests"] += 1
+            entry["queries"] += queries
+            entry["max_queries"] = max(entry["max_queries"], queries)
+            entry["query_seconds"].observe(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            statements = [
+                dict(histogram.snapshot(), sql=sql) for sql, histogram in self._statements.items()
+            ]
+            endpoints = {
+                endpoint: {
+                    "requests": entry["requests"],
+                    "queries": entry["queries"],
+                    "queries_per_request": round(entry["queries"] / entry["requests"], 2),
+                    "max_queries": entry["max_queries"],
+                    "query_seconds": entry["query_seconds"].snapshot(),
+                }
+                for endpoint, entry in self._endpoints.items()
+            }
+            slow = list(self._slow)
+        statements.sort(key=lambda item: item["sum"], reverse=True)
+        return {"statements": statements, "endpoints": endpoints, "slow_queries": slow}
+
+    def histograms(self):
+        with self._lock:
+            return [(sql, list(h.bounds), list(h.buckets), h.sum, h.count) for sql, h in self._statements.items()]
+
+queries = QueryMetrics(METRICS_MAX_STATEMENTS, DB_SLOW_QUERY_SECONDS, DB_SLOW_QUERY_LOG_SIZE)
+
+def record_query(sql, started):
+    seconds = time.perf_counter() - started
+    queries.record(sql, seconds)
+    if has_app_context():
+        g._query_count = g.get("_query_count", 0) + 1
+        g._query_seconds = g.get("_query_seconds", 0.0) + seconds
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, seconds, size, db_seconds, render_seconds, failed):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "latency": Histogram(),
+                    "size": Histogram(SIZE_BUCKETS),
+                    "db_seconds": 0.0,
+                    "render_seconds": 0.0,
+                    "errors": 0,
+                }
+            entry["latency"].observe(seconds)
+            # Streamed bodies (exports, SSE) have no length when the view returns.
+            if size is not None:
+                entry["size"].observe(size)
+            entry["db_seconds"] += db_seconds
+            entry["render_seconds"] += render_seconds
+            entry["errors"] += failed
+
+    def snapshot(self):
+        # Heaviest first: endpoints ranked by the total time they cost.
+        with self._lock:
+            endpoints = []
+            for endpoint, entry in self._endpoints.items():
+                latency = entry["latency"].snapshot()
+                total = latency["sum"] or 1e-9
+                endpoints.append(
+                    {
+                        "endpoint": endpoint,
+                        "latency": latency,
+                        "size": entry["size"].snapshot(),
+                        "errors": entry["errors"],
+                        "db_share": round(min(entry["db_seconds"] / total, 1.0), 3),
+                        "render_share": round(min(entry["render_seconds"] / total, 1.0), 3),
+                    }
+                )
+        endpoints.sort(key=lambda item: item["latency"]["sum"], reverse=True)
+        return endpoints
+
+    def histograms(self, kind):
+        with self._lock:
+            return [
+                (endpoint, list(entry[kind].bounds), list(entry[kind].buckets), entry[kind].sum, entry[kind].count)
+                for endpoint, entry in self._endpoints.items()
+            ]
+
+request_stats = RequestMetrics()
+
+def _before_request():
+    g._request_started = time.perf_counter()
+
+def _before_render(sender, template, context, **extra):
+    g._render_started = time.perf_counter()
+
+def _rendered(sender, template, context, **extra):
+    started = g.pop("_render_started", None)
+    if started is not None:
+        g._render_seconds = g.get("_render_seconds", 0.0) + time.perf_counter() - started
+
+def _after_request(response):
+    count = g.pop("_query_count", 0)
+    db_seconds = g.pop("_query_seconds", 0.0)
+    render_seconds = g.pop("_render_seconds", 0.0)
+    started = g.pop("_request_started", None)
+    seconds = time.perf_counter() - started if started is not None else 0.0
+    if request.endpoint:
+        queries.record_request(request.endpoint, count, db_seconds)
+        request_stats.record(
+            request.endpoint,
+            seconds,
+            None if response.is_streamed else response.content_length,
+            db_seconds,
+            render_seconds,
+            response.status_code >= 500,
+        )
+    if _show_server_timing():
+        response.headers["Server-Timing"] = ", ".join(
+            [
+                f"app;dur={seconds * 1000:.1f}",
+                f'db;dur={db_seconds * 1000:.1f};desc="{count} queries"',
+                f"render;dur={render_seconds * 1000:.1f}",
+            ]
+        )
+    return response
+
+def _show_server_timing():
+    # Query counts and DB time are internals: not for anonymous visitors.
+    if SERVER_TIMING:
+        return True
+    return current_user.is_authenticated and current_user.role == "admin"
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def _prometheus_histogram(lines, name, label, series):
+    for value, bounds, buckets, total, count in series:
+        cumulative = 0
+        for bound, bucket in zip(list(bounds) + ["+Inf"], buckets):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{{{label}="{_label(value)}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{_label(value)}"}} {total:.6f}')
+        lines.append(f'{name}_count{{{label}="{_label(value)}"}} {count}')
+
+def prometheus_text(gauges):
+    # gauges: {metric name: value} for the flat counters (pool, caches...).
+    lines = [
+        "# HELP reclamation_db_query_seconds Statement latency by normalized SQL.",
+        "# TYPE reclamation_db_query_seconds histogram",
+    ]
+    _prometheus_histogram(lines, "reclamation_db_query_seconds", "statement", queries.histograms())
+    lines.append("# HELP reclamation_request_seconds Request latency by endpoint.")
+    lines.append("# TYPE reclamation_request_seconds histogram")
+    _prometheus_histogram(lines, "reclamation_request_seconds", "endpoint", request_stats.histograms("latency"))
+    lines.append("# HELP reclamation_response_bytes Response body size by endpoint.")
+    lines.append("# TYPE reclamation_response_bytes histogram")
+    _prometheus_histogram(lines, "reclamation_response_bytes", "endpoint", request_stats.histograms("size"))
+    endpoints = queries.snapshot()["endpoints"]
+    lines.append("# HELP reclamation_db_queries_total Statements executed by endpoint.")
+    lines.append("# TYPE reclamation_db_queries_total counter")
+    for endpoint, entry in endpoints.items():
+        lines.append(f'reclamation_db_queries_total{{endpoint="{_label(endpoint)}"}} {entry["queries"]}')
+    lines.append("# HELP reclamation_db_requests_total Requests served by endpoint.")
+    lines.append("# TYPE reclamation_db_requests_total counter")
+    for endpoint, entry in endpoints.items():
+        lines.append(f'reclamation_db_requests_total{{endpoint="{_label(endpoint)}"}} {entry["requests"]}')
+    for name, value in gauges.items():
+        lines.append(f"# HELP reclamation_{name} Current value of {name.replace('_', ' ')}.")
+        lines.append(f"# TYPE reclamation_{name} gauge")
+        lines.append(f"reclamation_{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,24 +1,45 @@
+import json
 import os
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
 
 import os
 import ssl
 import pg8000
 
+from config import DATABASE_PATH, MIGRATE_CHUNK_SIZE, MIGRATE_WORKERS, SYNC_OVERLAP_SECONDS
+from database import get_db, pg_copy
 from models import init_db
+from time_utils import now_local_str, parse_dt
+import counters
 
-ROOT = Path(__file__).resolve().parent
-SQLITE_PATH = ROOT / "reclamation.db"
+# The SQLite file the application itself uses (DATABASE_PATH).
+SQLITE_PATH = Path(DATABASE_PATH)
 
-TABLE_ORDER = [
-    "bureaux",
-    "users",
-    "types_reclamation",
-    "reclamations",
-    "pieces_jointes",
-    "historique_statut",
+# Tables in the same stage don't reference each other and are copied in
+# parallel; a stage starts once the tables it references are loaded.
+TABLE_STAGES = [
+    ["bureaux", "types_reclamation", "blobs"],
+    ["users"],
+    ["reclamations"],
+    ["pieces_jointes", "historique_statut"],
 ]
+TABLE_ORDER = [table for stage in TABLE_STAGES for table in stage]
+SERIAL_TABLES = [table for table in TABLE_ORDER if table != "blobs"]
+
+# `sync` mode copies what changed since the watermark stored in Postgres:
+# small reference tables are reloaded whole (their edits leave no trace),
+# reclamations are upserted by id and change timestamps, and the other
+# tables receive new ids plus the rows whose backfilled columns are still
+# NULL in Postgres (storage.migrate_legacy sets pieces_jointes.sha256 after
+# the row was copied). Any other in-place edit needs a full migration.
+FULL_SYNC_TABLES = {"bureaux", "types_reclamation", "users", "blobs"}
+CHANGE_COLUMNS = {"reclamations": ["updated_at", "reminder_last_sent_at"]}
+BACKFILL_COLUMNS = {"pieces_jointes": ["sha256"]}
 
 def _pg_connect():
     db_url = os.getenv("DATABASE_URL", "").strip()
@@ -41,28 +62,141 @@ def _sqlite_columns(cur, table):
     cols = cur.execute(f"PRAGMA table_info({table})").fetchall()
     return [c["name"] for c in cols]
 
-def _copy_table(sqlite_conn, pg_conn, table):
-    sqlite_cur = sqlite_conn.cursor()
-    cols = _sqlite_columns(sqlite_cur, table)
-    if not cols:
-        return
-    rows = sqlite_cur.execute(
-        f"SELECT {', '.join(cols)} FROM {table}"
-    ).fetchall()
+class _Progress:
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._lock = threading.Lock()
 
-    if not rows:
-        return
+    def report(self, table, done, total, started, final=False, last_report=None):
+        now = time.monotonic()
+        if not final and last_report is not None and now - last_report < self.interval:
+            return last_report
+        rate = done / max(now - started, 1e-6)
+        with self._lock:
+            print(f"{table}: {done}/{total} rows ({rate:.0f} rows/s){' done' if final else ''}", flush=True)
+        return now
 
-    pg_cur = pg_conn.cursor()
-    placeholders = ", ".join(["%s"] * len(cols))
-    col_list = ", ".join(cols)
-    sql = f"INSERT INTO {table} ({col_list}) VALUES ({placeholders})"
-    values = [tuple(row[col] for col in cols) for row in rows]
-    pg_cur.executemany(sql, values)
+def _watermark(sqlite_cur, table, cols):
+    # Read before the rows themselves: anything written while the copy runs
+    # is past the watermark and picked up by the next sync.
+    if "id" not in cols:
+        return None, None
+    change_cols = [col for col in CHANGE_COLUMNS.get(table, []) if col in cols]
+    selects = ["MAX(id)"] + [f"MAX({col})" for col in change_cols]
+    row = sqlite_cur.execute(f"SELECT {', '.join(selects)} FROM {table}").fetchone()
+    changed = [str(value) for value in row[1:] if value is not None]
+    return row[0] or 0, max(changed) if changed else None
+
+def _load_watermark(pg_cur, table):
+    pg_cur.execute("SELECT last_id, last_changed_at FROM sync_watermarks WHERE table_name = %s", (table,))
+    return pg_cur.fetchone()
+
+def _save_watermark(pg_cur, table, last_id, last_changed_at):
+    pg_cur.execute(
+        """
+        INSERT INTO sync_watermarks (table_name, last_id, last_changed_at, synced_at)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (table_name) DO UPDATE SET
+            last_id = EXCLUDED.last_id,
+            last_changed_at = EXCLUDED.last_changed_at,
+            synced_at = EXCLUDED.synced_at
+        """,
+        (table, last_id, last_changed_at, now_local_str()),
+    )
+
+def _changed_since(last_changed_at):
+    # Overlap covers transactions that stamped their row just before the
+    # watermark was read but committed after it; re-copying is harmless.
+    changed = parse_dt(last_changed_at)
+    if changed is None:
+        return "0000-00-00 00:00:00"
+    return (changed - timedelta(seconds=SYNC_OVERLAP_SECONDS)).strftime("%Y-%m-%d %H:%M:%S")
+
+def _sync_plan(pg_cur, table, cols, last_id, incremental):
+    # Returns (WHERE clause, params, upsert?) for the rows to read from SQLite.
+    if last_id is None or table in FULL_SYNC_TABLES:
+        if incremental:
+            pg_cur.execute(f"DELETE FROM {table}")
+        return ("id <= ?", [last_id], False) if last_id is not None else ("1 = 1", [], False)
+    if not incremental:
+        return "id <= ?", [last_id], False
+    state = _load_watermark(pg_cur, table)
+    if state is None:
+        raise RuntimeError(f"No watermark for {table}: run a full migration first.")
+    previous_id, previous_changed = state
+    conditions = ["id > ?"]
+    params = [previous_id]
+    change_cols = [col for col in CHANGE_COLUMNS.get(table, []) if col in cols]
+    if change_cols:
+        since = _changed_since(previous_changed)
+        conditions += [f"{col} >= ?" for col in change_cols]
+        params += [since] * len(change_cols)
+    backfill_cols = [col for col in BACKFILL_COLUMNS.get(table, []) if col in cols]
+    if backfill_cols:
+        pg_cur.execute(
+            f"SELECT id FROM {table} WHERE id <= %s AND ({' OR '.join(f'{col} IS NULL' for col in backfill_cols)})",
+            (previous_id,),
+        )
+        pending = [row[0] for row in pg_cur.fetchall()]
+        if pending:
+            conditions.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(pending))
+    upsert = len(conditions) > 1
+    return f"({' OR '.join(conditions)}) AND id <= ?", params + [last_id], upsert
+
+def _copy_table(table, progress, incremental=False):
+    # Streams the table MIGRATE_CHUNK_SIZE rows at a time, one COPY per chunk,
+    # inside a single Postgres transaction that also records the watermark.
+    sqlite_conn = _sqlite_connect()
+    pg_conn = _pg_connect()
+    try:
+        sqlite_cur = sqlite_conn.cursor()
+        cols = _sqlite_columns(sqlite_cur, table)
+        if not cols:
+            return 0
+        last_id, last_changed_at = _watermark(sqlite_cur, table, cols)
+        pg_cur = pg_conn.cursor()
+        where, params, upsert = _sync_plan(pg_cur, table, cols, last_id, incremental)
+        target = table
+        if upsert:
+            target = f"sync_{table}"
+            pg_cur.execute(f"CREATE TEMP TABLE {target} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        total = sqlite_cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+        sqlite_cur.execute(f"SELECT {', '.join(cols)} FROM {table} WHERE {where} ORDER BY rowid", params)
+        started = time.monotonic()
+        last_report = None
+        done = 0
+        while True:
+            rows = sqlite_cur.fetchmany(MIGRATE_CHUNK_SIZE)
+            if not rows:
+                break
+            pg_copy(pg_cur, target, cols, rows)
+            done += len(rows)
+            last_report = progress.report(table, done, total, started, last_report=last_report)
+        if upsert and done:
+            updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in cols if col != "id")
+            pg_cur.execute(
+                f"""
+                INSERT INTO {table} ({', '.join(cols)})
+                SELECT {', '.join(cols)} FROM {target}
+                ON CONFLICT (id) DO UPDATE SET {updates}
+                """
+            )
+        if last_id is not None:
+            _save_watermark(pg_cur, table, last_id, last_changed_at)
+        pg_conn.commit()
+        progress.report(table, done, total, started, final=True)
+        return done
+    except Exception:
+        pg_conn.rollback()
+        raise
+    finally:
+        sqlite_conn.close()
+        pg_conn.close()
 
 def _reset_sequences(pg_conn):
     cur = pg_conn.cursor()
-    for table in TABLE_ORDER:
+    for table in SERIAL_TABLES:
         cur.execute(
             f"""
             SELECT setval(
@@ -74,41 +208,110 @@ def _reset_sequences(pg_conn):
             (table,),
         )
 
+def _verify_counts(pg_conn, strict=True):
+    sqlite_conn = _sqlite_connect()
+    pg_cur = pg_conn.cursor()
+    mismatches = []
+    try:
+        for table in TABLE_ORDER:
+            if not _sqlite_columns(sqlite_conn.cursor(), table):
+                continue
+            expected = sqlite_conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            pg_cur.execute(f"SELECT COUNT(*) FROM {table}")
+            actual = pg_cur.fetchone()[0]
+            status = "ok" if expected == actual else "MISMATCH"
+            print(f"verify {table}: sqlite={expected} postgres={actual} {status}")
+            if expected != actual:
+                mismatches.append(table)
+    finally:
+        sqlite_conn.close()
+    if mismatches and strict:
+        raise RuntimeError(f"Row counts differ for: {', '.join(mismatches)}")
+
+def _rebuild_counters():
+    with get_db() as db:
+        counters.rebuild(db)
+        db.commit()
+
+def _ensure_watermarks(pg_conn):
+    pg_conn.cursor().execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_watermarks (
+            table_name TEXT PRIMARY KEY,
+            last_id INTEGER,
+            last_changed_at TEXT,
+            synced_at TEXT
+        )
+        """
+    )
+    pg_conn.commit()
+
+def _copy_stages(incremental):
+    progress = _Progress()
+    with ThreadPoolExecutor(max_workers=max(1, MIGRATE_WORKERS)) as executor:
+        for stage in TABLE_STAGES:
+            futures = [executor.submit(_copy_table, table, progress, incremental) for table in stage]
+            for future in futures:
+                future.result()
+
 def migrate():
     # Ensure Postgres schema exists
     init_db()
 
-    sqlite_conn = _sqlite_connect()
     pg_conn = _pg_connect()
     pg_conn.autocommit = False
-
     try:
+        _ensure_watermarks(pg_conn)
         pg_cur = pg_conn.cursor()
-        pg_cur.execute(
-            """
-            TRUNCATE TABLE
-                pieces_jointes,
-                historique_statut,
-                reclamations,
-                types_reclamation,
-                users,
-                bureaux
-            RESTART IDENTITY CASCADE
-            """
-        )
+        pg_cur.execute(f"TRUNCATE TABLE {', '.join(TABLE_ORDER)}, sync_watermarks RESTART IDENTITY CASCADE")
+        pg_conn.commit()
 
-        for table in TABLE_ORDER:
-            _copy_table(sqlite_conn, pg_conn, table)
+        # Each table commits on its own connection; a failed run leaves a
+        # partial copy that the next run truncates again.
+        started = time.monotonic()
+        _copy_stages(incremental=False)
 
         _reset_sequences(pg_conn)
         pg_conn.commit()
+        _verify_counts(pg_conn)
+        print(f"Copied {len(TABLE_ORDER)} tables in {time.monotonic() - started:.1f}s.")
     except Exception:
         pg_conn.rollback()
         raise
     finally:
-        sqlite_conn.close()
         pg_conn.close()
+    _rebuild_counters()
+
+def sync():
+    # Repeatable while the SQLite app keeps running; the last run, with
+    # writes frozen, is the cutover and must report matching counts.
+    init_db()
+
+    pg_conn = _pg_connect()
+    pg_conn.autocommit = False
+    try:
+        _ensure_watermarks(pg_conn)
+        started = time.monotonic()
+        _copy_stages(incremental=True)
+
+        _reset_sequences(pg_conn)
+        pg_conn.commit()
+        _verify_counts(pg_conn, strict=False)
+        print(f"Synced {len(TABLE_ORDER)} tables in {time.monotonic() - started:.1f}s.")
+    except Exception:
+        pg_conn.rollback()
+        raise
+    finally:
+        pg_conn.close()
+    _rebuild_counters()
 
 if __name__ == "__main__":
-    migrate()
-    print("Migration complete.")
+    import sys
+
+    modes = {"full": migrate, "sync": sync}
+    mode = sys.argv[1] if len(sys.argv) > 1 else "full"
+    if mode not in modes or len(sys.argv) > 2:
+        print("Usage: python migrate_sqlite_to_postgres.py [full|sync]")
+        sys.exit(1)
+    modes[mode]()
+    print("Migration complete." if mode == "full" else "Sync complete.")
@@ -1,4 +1,8 @@
 from database import get_db, is_postgres
+from search import init_search
+import refdata
+import counters
+from time_utils import now_local_str
 
 def _add_column_if_missing(db, table, column, col_def):
     if is_postgres():
@@ -34,18 +38,47 @@ def _province_from_code(code_value):
         "6": "TOLIARA",
     }.get(first)
 
+def _get_meta(db, key):
+    row = db.execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+def _set_meta(db, key, value):
+    db.execute(
+        """
+        INSERT INTO app_meta (key, value) VALUES (?, ?)
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        """,
+        (key, value),
+    )
+
+def _file_sha256(path):
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 def _seed_bureaux_from_xlsx(db):
     import os
-    try:
-        from openpyxl import load_workbook
-    except Exception:
-        return
 
     path = os.path.join(os.path.abspath(os.path.dirname(__file__)), "codidue.xlsx")
     if not os.path.exists(path):
         return
 
+    # Only re-read the workbook when its content changed since the last seed.
+    checksum = _file_sha256(path)
+    if _get_meta(db, "bureaux_seed_sha256") == checksum:
+        return
+
+    try:
+        from openpyxl import load_workbook
+    except Exception:
+        return
+
     wb = load_workbook(path, read_only=True, data_only=True)
+    rows = {}
     for sheet_name in wb.sheetnames:
         ws = wb[sheet_name]
         for row in ws.iter_rows(values_only=True):
@@ -61,25 +94,30 @@ def _seed_bureaux_from_xlsx(db):
             name_str = str(name).strip()
             if not code_str or not name_str:
                 continue
-            province = _province_from_code(code_str)
-
-            existing = db.execute(
-                "SELECT id FROM bureaux WHERE code_bureau = ?",
-                (code_str,),
-            ).fetchone()
-            if existing:
-                db.execute(
-                    "UPDATE bureaux SET nom_bureau = ?, province = ? WHERE code_bureau = ?",
-                    (name_str, province, code_str),
-                )
-            else:
-                db.execute(
-                    "INSERT INTO bureaux (code_bureau, nom_bureau, province) VALUES (?, ?, ?)",
-                    (code_str, name_str, province),
-                )
+            rows[code_str] = (code_str, name_str, _province_from_code(code_str))
+    wb.close()
 
-def init_db():
-    db = get_db()
+    before = db.execute("SELECT COUNT(*) AS n FROM bureaux").fetchone()["n"]
+    # Multi-row VALUES: one round trip per 300 bureaux even over a remote
+    # Postgres link, and under SQLite's 999 bound-parameter limit.
+    values = list(rows.values())
+    for start in range(0, len(values), 300):
+        batch = values[start:start + 300]
+        db.execute(
+            f"""
+            INSERT INTO bureaux (code_bureau, nom_bureau, province)
+            VALUES {', '.join(['(?, ?, ?)'] * len(batch))}
+            ON CONFLICT (code_bureau) DO UPDATE SET
+                nom_bureau = EXCLUDED.nom_bureau,
+                province = EXCLUDED.province
+            """,
+            [value for row in batch for value in row],
+        )
+    after = db.execute("SELECT COUNT(*) AS n FROM bureaux").fetchone()["n"]
+    counters.bump(db, {"bureaux": after - before})
+    _set_meta(db, "bureaux_seed_sha256", checksum)
+
+def _migration_001_base_schema(db):
     if is_postgres():
         db.executescript("""
         CREATE TABLE IF NOT EXISTS bureaux (
@@ -279,7 +317,96 @@ def init_db():
     db.execute("UPDATE historique_statut SET nouveau_statut = 'TRAITEE' WHERE nouveau_statut = 'VALIDEE'")
     db.execute("UPDATE historique_statut SET ancien_statut = 'TRAITEE' WHERE ancien_statut = 'VALIDEE'")
 
-    _seed_bureaux_from_xlsx(db)
+def _migration_002_hot_path_indexes(db):
+    db.executescript("""
+    CREATE INDEX IF NOT EXISTS idx_reclamations_user ON reclamations (user_id);
+    CREATE INDEX IF NOT EXISTS idx_reclamations_statut_archived ON reclamations (statut, archived);
+    CREATE INDEX IF NOT EXISTS idx_reclamations_created ON reclamations (created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_reclamations_archived_created ON reclamations (archived, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_reclamations_reminder_auto ON reclamations (reminder_auto_at);
+    CREATE INDEX IF NOT EXISTS idx_historique_reclamation_created ON historique_statut (reclamation_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_pieces_filename ON pieces_jointes (filename);
+    CREATE INDEX IF NOT EXISTS idx_pieces_reclamation ON pieces_jointes (reclamation_id);
+    """)
+
+def _migration_003_search_index(db):
+    init_search(db)
+
+def _migration_004_counters(db):
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    counters.rebuild(db)
+
+def _migration_005_blob_storage(db):
+    _add_column_if_missing(db, "pieces_jointes", "sha256", "sha256 TEXT")
+    if is_postgres():
+        created_type = "TIMESTAMP"
+    else:
+        created_type = "DATETIME"
+    db.execute(f"""
+    CREATE TABLE IF NOT EXISTS blobs (
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        created_at {created_type}
+    )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_pieces_sha256 ON pieces_jointes (sha256)")
+
+def _migration_006_app_meta(db):
+    db.execute("CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+# Each step runs exactly once; append new steps, never edit applied ones.
+MIGRATIONS = [
+    (1, "base schema", _migration_001_base_schema),
+    (2, "hot path indexes", _migration_002_hot_path_indexes),
+    (3, "search index", _migration_003_search_index),
+    (4, "materialized counters", _migration_004_counters),
+    (5, "content-addressed attachments", _migration_005_blob_storage),
+    (6, "app metadata", _migration_006_app_meta),
+]
+
+def _schema_version(db):
+    if is_postgres():
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+    else:
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+        """)
+    row = db.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()
+    return row["version"] or 0
+
+def migrate_schema(db):
+    current = _schema_version(db)
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(db)
+        db.execute(
+            "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+            (version, description, now_local_str()),
+        )
+        db.commit()
+
+def init_db():
+    with get_db() as db:
+        migrate_schema(db)
+
+        _seed_bureaux_from_xlsx(db)
 
-    db.commit()
-    db.close()
+        db.commit()
+    refdata.invalidate()
@@ -1,16 +1,173 @@
+import json
+import queue
+import threading
+import time
+import urllib.request
+from config import (
+    NOTIFY_SINKS,
+    NOTIFY_WEBHOOK_URL,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_WORKERS,
+    NOTIFY_COALESCE_SECONDS,
+    NOTIFY_DELAY_WARN_SECONDS,
+)
+
 try:
     from win10toast import ToastNotifier
 except Exception:  # pragma: no cover - optional dependency
     ToastNotifier = None
 
-_notifier = None
+class ToastSink:
+    def __init__(self):
+        self._notifier = None
 
-def send_desktop_notification(title, message):
-    global _notifier
-    if ToastNotifier is None:
-        # Fallback: no Windows notifier installed
+    def send(self, title, message):
+        if self._notifier is None:
+            self._notifier = ToastNotifier()
+        self._notifier.show_toast(title, message, duration=8, threaded=True)
+
+class LogSink:
+    def send(self, title, message):
         print(f"[NOTIFY] {title} - {message}")
-        return
-    if _notifier is None:
-        _notifier = ToastNotifier()
-    _notifier.show_toast(title, message, duration=8, threaded=True)
+
+class WebhookSink:
+    # Stand-in for a local relay (chat bot, SMS gateway...) listening on HTTP.
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title, message):
+        body = json.dumps({"title": title, "message": message}).encode("utf-8")
+        req = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        urllib.request.urlopen(req, timeout=self.timeout).close()
+
+def _default_sinks():
+    sinks = []
+    for name in NOTIFY_SINKS:
+        if name == "toast" and ToastNotifier is not None:
+            sinks.append(ToastSink())
+        elif name == "log":
+            sinks.append(LogSink())
+        elif name == "webhook" and NOTIFY_WEBHOOK_URL:
+            sinks.append(WebhookSink(NOTIFY_WEBHOOK_URL))
+    if not sinks:
+        # Fallback: no Windows notifier installed
+        sinks.append(LogSink())
+    return sinks
+
+class NotificationDispatcher:
+    # Requests only enqueue; worker threads drain the queue, merging the burst
+    # collected during NOTIFY_COALESCE_SECONDS into one notification per title.
+    def __init__(self, sinks, maxsize, workers, coalesce_seconds, delay_warn_seconds):
+        self.sinks = list(sinks)
+        self.workers = max(1, workers)
+        self.coalesce_seconds = coalesce_seconds
+        self.delay_warn_seconds = delay_warn_seconds
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "dispatched": 0,
+            "coalesced": 0,
+            "delayed": 0,
+            "sink_errors": 0,
+            "max_delay_seconds": 0.0,
+        }
+
+    def add_sink(self, sink):
+        with self._lock:
+            self.sinks.append(sink)
+
+    def submit(self, title, message):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.monotonic(), title, message))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _ensure_started(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.coalesce_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            grouped = {}
+            for item in batch:
+                grouped.setdefault(item[1], []).append(item)
+            for title, items in grouped.items():
+                if len(items) == 1:
+                    message = items[0][2]
+                else:
+                    message = f"{items[0][2]} (+{len(items) - 1} autres)"
+                    self._count("coalesced", len(items) - 1)
+                self._deliver(title, message)
+                self._record_delay(items[0][0])
+
+    def _deliver(self, title, message):
+        with self._lock:
+            sinks = list(self.sinks)
+        for sink in sinks:
+            try:
+                sink.send(title, message)
+            except Exception as exc:
+                self._count("sink_errors")
+                print(f"[NOTIFY] {type(sink).__name__} error: {exc}")
+        self._count("dispatched")
+
+    def _record_delay(self, enqueued_at):
+        delay = time.monotonic() - enqueued_at
+        with self._lock:
+            self._stats["max_delay_seconds"] = max(self._stats["max_delay_seconds"], delay)
+            if delay > self.delay_warn_seconds:
+                self._stats["delayed"] += 1
+
+dispatcher = NotificationDispatcher(
+    _default_sinks(),
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_WORKERS,
+    NOTIFY_COALESCE_SECONDS,
+    NOTIFY_DELAY_WARN_SECONDS,
+)
+
+def send_desktop_notification(title, message):
+    return dispatcher.submit(title, message)
+
+def notification_stats():
+    return dispatcher.stats()
@@ -0,0 +1,100 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from uuid import uuid4
+from flask import g, request
+from config import PROFILE_SAMPLE_RATE, PROFILE_TRACEMALLOC, PROFILE_DIR, PROFILE_KEEP
+
+# cProfile and tracemalloc are process-wide, so at most one request is sampled
+# at a time; requests arriving meanwhile are simply not sampled. With
+# tracemalloc on, allocations made by concurrent requests are counted too.
+_sampling = threading.Lock()
+_NAME_RE = re.compile(r"[^A-Za-z0-9_-]+")
+
+def _start():
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        return
+    if not _sampling.acquire(blocking=False):
+        return
+    try:
+        started_tracing = PROFILE_TRACEMALLOC and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        profiler = cProfile.Profile()
+        profiler.enable()
+    except Exception:
+        _sampling.release()
+        raise
+    g._profile = (profiler, started_tracing, time.perf_counter())
+
+def _finish(exc=None):
+    sample = g.pop("_profile", None)
+    if sample is None:
+        return
+    profiler, started_tracing, started = sample
+    try:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        peak = tracemalloc.get_traced_memory()[1] if snapshot else None
+        if started_tracing:
+            tracemalloc.stop()
+        _write(request.endpoint or "unknown", time.perf_counter() - started, profiler, snapshot, peak)
+    except Exception as error:
+        print(f"[PROFILE] {error}")
+    finally:
+        _sampling.release()
+
+def _write(endpoint, seconds, profiler, snapshot, peak):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    # The random suffix keeps two samples taken in the same second apart.
+    taken_at = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}"
+    stem = f"{taken_at}_{_NAME_RE.sub('-', endpoint)}_{seconds * 1000:.0f}ms"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{stem}.prof"))
+    if snapshot is not None:
+        with open(os.path.join(PROFILE_DIR, f"{stem}.mem.txt"), "w", encoding="utf-8") as out:
+            out.write(f"peak traced memory: {peak} bytes\n")
+            for stat in snapshot.statistics("lineno")[:30]:
+                out.write(f"{stat}\n")
+    _rotate()
+
+def _rotate():
+    samples = {}
+    for name in os.listdir(PROFILE_DIR):
+        samples.setdefault(name.split(".", 1)[0], []).append(name)
+    for stem in sorted(samples)[:-PROFILE_KEEP or None]:
+        for name in samples[stem]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name))
+            except OSError:
+                pass
+
+def list_profiles():
+    # Newest first: (file name, endpoint, duration label, companion memory report).
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = set(os.listdir(PROFILE_DIR))
+    profiles = []
+    for name in sorted(names, reverse=True):
+        if not name.endswith(".prof"):
+            continue
+        stem = name[: -len(".prof")]
+        parts = stem.split("_")
+        memory = f"{stem}.mem.txt"
+        profiles.append(
+            {
+                "name": name,
+                "taken_at": parts[0].rsplit("-", 1)[0],
+                "endpoint": "_".join(parts[1:-1]),
+                "duration": parts[-1],
+                "memory": memory if memory in names else None,
+            }
+        )
+    return profiles
+
+def init_app(app):
+    app.before_request(_start)
+    app.teardown_request(_finish)
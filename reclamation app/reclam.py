@@ -1,12 +1,15 @@
-from database import get_db, is_postgres
+from database import get_db, is_postgres, init_app as init_db_pool
 from flask import Flask
 from flask_login import LoginManager
+from metrics import init_app as init_metrics
+from profiling import init_app as init_profiling
 from config import SECRET_KEY, UPLOAD_FOLDER, MAX_CONTENT_LENGTH
 from models import init_db
 from auth import auth_bp, load_user
 from reclamations import reclamation_bp
 from admin import admin_bp
 from main import main_bp
+from events import events_bp
 from reminder_worker import start_reminder_worker
 import os
 
@@ -14,6 +17,9 @@ app = Flask(__name__)
 app.secret_key = SECRET_KEY
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
+init_db_pool(app)
+init_metrics(app)
+init_profiling(app)
 
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
@@ -24,6 +30,7 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(reclamation_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(main_bp)
+app.register_blueprint(events_bp)
 
 if __name__ == "__main__":
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -0,0 +1,117 @@
+from database import is_postgres
+from time_utils import now_local
+import refdata
+import counters
+
+# Shared write path for new reclamations. Ids are reserved up front so the
+# dossier number and creation date go in with the row instead of two UPDATEs.
+RECLAMATION_COLUMNS = (
+    "id",
+    "numero_dossier",
+    "bureau_id",
+    "user_id",
+    "type_id",
+    "numero_compte",
+    "nom_client",
+    "ancienne_valeur",
+    "nouvelle_valeur",
+    "motif",
+    "statut",
+    "archived",
+    "created_at",
+)
+HISTORY_COLUMNS = ("reclamation_id", "ancien_statut", "nouveau_statut", "observation", "user_id", "created_at")
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+def validate(values, bureau_id):
+    # Same rules for the form, the JSON API and bulk imports.
+    # Returns (entry for insert_reclamations, error message).
+    numero_compte = _text(values.get("numero_compte"))
+    nom_client = _text(values.get("nom_client"))
+    type_id = values.get("type_id") or None
+    if not numero_compte or not nom_client or not type_id:
+        return None, "Veuillez remplir tous les champs."
+    type_row = refdata.types().get(type_id)
+    if not type_row or type_row["actif"] != 1:
+        return None, "Type inconnu ou inactif."
+    motif = _text(values.get("motif"))
+    if not motif and type_row["code"] == "AUTRE":
+        return None, "Le motif est obligatoire pour le type Autre."
+    return {
+        "bureau_id": bureau_id,
+        "type_id": type_row["id"],
+        "numero_compte": numero_compte,
+        "nom_client": nom_client,
+        "ancienne_valeur": _text(values.get("ancienne_valeur")),
+        "nouvelle_valeur": _text(values.get("nouvelle_valeur")),
+        "motif": motif,
+    }, None
+
+def reserve_ids(db, count):
+    if count <= 0:
+        return []
+    if is_postgres():
+        rows = db.execute(
+            "SELECT nextval(pg_get_serial_sequence('reclamations', 'id')) AS id FROM generate_series(1, ?)",
+            (count,),
+        ).fetchall()
+        return [row["id"] for row in rows]
+    # Take the write lock first so no other writer can claim the same range;
+    # inserting explicit ids moves sqlite_sequence forward on its own.
+    if not db.conn.in_transaction:
+        db.execute("BEGIN IMMEDIATE")
+    row = db.execute(
+        """
+        SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'reclamations'), 0),
+            COALESCE((SELECT MAX(id) FROM reclamations), 0)
+        ) AS last_id
+        """
+    ).fetchone()
+    first = row["last_id"] + 1
+    return list(range(first, first + count))
+
+def dossier_number(reclamation_id, when):
+    return f"REC-{when.strftime('%Y%m%d')}-{reclamation_id:05d}"
+
+def insert_reclamations(db, entries, user_id):
+    # entries: dicts with bureau_id, type_id, numero_compte, nom_client,
+    # ancienne_valeur, nouvelle_valeur and motif. The caller commits.
+    if not entries:
+        return []
+    now = now_local()
+    created_at = now.strftime("%Y-%m-%d %H:%M:%S")
+    ids = reserve_ids(db, len(entries))
+    created = []
+    rows = []
+    history = []
+    deltas = {}
+    for reclamation_id, entry in zip(ids, entries):
+        numero_dossier = dossier_number(reclamation_id, now)
+        rows.append(
+            (
+                reclamation_id,
+                numero_dossier,
+                entry["bureau_id"],
+                user_id,
+                entry["type_id"],
+                entry["numero_compte"],
+                entry["nom_client"],
+                entry["ancienne_valeur"],
+                entry["nouvelle_valeur"],
+                entry["motif"],
+                "EN_ATTENTE",
+                0,
+                created_at,
+            )
+        )
+        history.append((reclamation_id, None, "EN_ATTENTE", "Creation", user_id, created_at))
+        for name, delta in counters.reclamation_created(entry["bureau_id"]).items():
+            deltas[name] = deltas.get(name, 0) + delta
+        created.append({"id": reclamation_id, "numero_dossier": numero_dossier, "created_at": created_at})
+    db.copy_rows("reclamations", RECLAMATION_COLUMNS, rows)
+    db.copy_rows("historique_statut", HISTORY_COLUMNS, history)
+    counters.bump(db, deltas)
+    return created
@@ -1,34 +1,46 @@
 import os
 import math
-from datetime import datetime, timedelta
+import base64
+import csv
+import io
+import tempfile
+from datetime import timedelta
 from uuid import uuid4
-from flask import Blueprint, render_template, request, redirect, url_for, current_app, send_from_directory, abort, flash, jsonify
+from flask import Blueprint, Response, render_template, request, redirect, url_for, current_app, abort, flash, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from database import get_db, is_postgres
+from werkzeug.utils import secure_filename, safe_join, send_file as werkzeug_send_file
+from database import get_db, connect_db
 from auth import role_required
-from config import ALLOWED_EXTENSIONS
+from config import (
+    ALLOWED_EXTENSIONS,
+    DASHBOARD_PAGE_SIZE,
+    DASHBOARD_MAX_PAGE_SIZE,
+    DASHBOARD_TOTAL_COUNT,
+    SEARCH_MAX_RESULTS,
+    EXPORT_BATCH_SIZE,
+    EXPORT_CSV_DELIMITER,
+    API_BATCH_MAX,
+    UPLOAD_CHUNK_SIZE,
+    DOWNLOAD_OFFLOAD,
+    DOWNLOAD_ACCEL_PREFIX,
+    DOWNLOAD_MAX_AGE,
+)
 from notifications import send_desktop_notification
-from time_utils import now_local, now_local_str
+from search import search_source
+import refdata
+import counters
+import reclamation_store
+import storage
+import images
+from events import publish, STAFF_ROLES
+from reminder_worker import schedule_reminder, cancel_reminder
+from time_utils import now_local, now_local_str, parse_dt
 
 reclamation_bp = Blueprint("reclamation", __name__)
 
 def _allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def _parse_dt(value):
-    if not value:
-        return None
-    if isinstance(value, datetime):
-        return value
-    try:
-        return datetime.fromisoformat(str(value))
-    except Exception:
-        try:
-            return datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S")
-        except Exception:
-            return None
-
 @reclamation_bp.route("/notifications/user", methods=["GET"])
 @login_required
 def user_notifications():
@@ -65,71 +77,290 @@ def user_notifications():
     ]
     return jsonify({"updates": updates, "server_time": now_local_str()})
 
-@reclamation_bp.route("/dashboard", methods=["GET"])
-@login_required
-def dashboard():
-    db = get_db()
-    types = db.execute(
-        "SELECT id, libelle FROM types_reclamation WHERE actif = 1 ORDER BY libelle"
-    ).fetchall()
-    bureaux = db.execute(
-        "SELECT id, code_bureau, nom_bureau FROM bureaux ORDER BY nom_bureau"
-    ).fetchall()
+def _encode_cursor(created_at, reclamation_id):
+    raw = f"{created_at}|{reclamation_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
 
-    statut = request.args.get("statut") or ""
-    bureau_id = request.args.get("bureau_id") or ""
-    type_id = request.args.get("type_id") or ""
-    search = request.args.get("search") or ""
-    archived = request.args.get("archived") == "1"
+def _decode_cursor(value):
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value.encode("ascii")).decode("utf-8")
+        created_at, reclamation_id = raw.rsplit("|", 1)
+        return created_at, int(reclamation_id)
+    except Exception:
+        return None
+
+def _page_size():
+    try:
+        per_page = int(request.args.get("per_page") or DASHBOARD_PAGE_SIZE)
+    except ValueError:
+        per_page = DASHBOARD_PAGE_SIZE
+    return max(1, min(per_page, DASHBOARD_MAX_PAGE_SIZE))
 
+def _page_number():
+    try:
+        return max(1, int(request.args.get("page") or 1))
+    except ValueError:
+        return 1
+
+def _filter_args(args):
+    link_args = {k: v for k, v in args.items() if v and k != "archived"}
+    if args["archived"]:
+        link_args["archived"] = 1
+    return link_args
+
+def _dashboard_filters(db):
+    args = {
+        "statut": request.args.get("statut") or "",
+        "bureau_id": request.args.get("bureau_id") or "",
+        "type_id": request.args.get("type_id") or "",
+        "search": request.args.get("search") or "",
+        "archived": request.args.get("archived") == "1",
+    }
+
+    source = "reclamations r"
+    ranked = False
     filters = []
     params = []
 
+    if args["search"]:
+        matches = search_source(db, args["search"])
+        if matches:
+            source, ranked = matches[0], True
+            params.extend(matches[1])
     if current_user.role == "agent":
         filters.append("r.user_id = ?")
         params.append(current_user.id)
-    if statut:
+    if args["statut"]:
         filters.append("r.statut = ?")
-        params.append(statut)
-    if bureau_id:
+        params.append(args["statut"])
+    if args["bureau_id"]:
         filters.append("r.bureau_id = ?")
-        params.append(bureau_id)
-    if type_id:
+        params.append(args["bureau_id"])
+    if args["type_id"]:
         filters.append("r.type_id = ?")
-        params.append(type_id)
-    if search:
+        params.append(args["type_id"])
+    if args["search"] and not ranked:
         filters.append("(r.numero_dossier LIKE ? OR r.numero_compte LIKE ? OR r.nom_client LIKE ?)")
-        like = f"%{search}%"
+        like = f"%{args['search']}%"
         params.extend([like, like, like])
 
     filters.append("r.archived = ?")
-    params.append(1 if archived else 0)
-    where_clause = "WHERE " + " AND ".join(filters) if filters else "WHERE r.archived = ?"
+    params.append(1 if args["archived"] else 0)
+    return args, source, ranked, filters, params
+
+@reclamation_bp.route("/dashboard", methods=["GET"])
+@login_required
+def dashboard():
+    types = refdata.active_types()
+    bureaux = refdata.bureaux().rows
+    db = get_db()
+
+    args, source, ranked, filters, params = _dashboard_filters(db)
+    per_page = _page_size()
+    count_arg = request.args.get("count")
+    if count_arg is not None:
+        with_total = count_arg == "1"
+    else:
+        with_total = DASHBOARD_TOTAL_COUNT and not ranked
+
+    total = None
+    if with_total:
+        total = db.execute(
+            f"SELECT COUNT(*) AS cnt FROM {source} WHERE {' AND '.join(filters)}",
+            params,
+        ).fetchone()["cnt"]
+
+    page_filters = list(filters)
+    page_params = list(params)
+    page = after = before = None
+    if ranked:
+        # Relevance scores move whenever the corpus changes, so a cursor on the
+        # score could skip or repeat rows: page by offset within the best
+        # SEARCH_MAX_RESULTS matches instead.
+        sort_col = "s.score"
+        page = _page_number()
+        offset = (page - 1) * per_page
+        limit = max(0, min(per_page + 1, SEARCH_MAX_RESULTS - offset))
+    else:
+        sort_col = "r.created_at"
+        after = _decode_cursor(request.args.get("after"))
+        before = None if after else _decode_cursor(request.args.get("before"))
+        offset, limit = 0, per_page + 1
+    if after:
+        page_filters.append(f"({sort_col} < ? OR ({sort_col} = ? AND r.id < ?))")
+        page_params.extend([after[0], after[0], after[1]])
+        order = "DESC"
+    elif before:
+        page_filters.append(f"({sort_col} > ? OR ({sort_col} = ? AND r.id > ?))")
+        page_params.extend([before[0], before[0], before[1]])
+        order = "ASC"
+    else:
+        order = "DESC"
 
     query = f"""
         SELECT r.id, r.numero_dossier, r.numero_compte, r.nom_client, r.motif,
-               r.statut, r.created_at, b.nom_bureau, t.libelle, u.username
-        FROM reclamations r
+               r.statut, r.created_at, b.nom_bureau, t.libelle, u.username,
+               {sort_col} AS sort_key
+        FROM {source}
         LEFT JOIN bureaux b ON b.id = r.bureau_id
         LEFT JOIN types_reclamation t ON t.id = r.type_id
         LEFT JOIN users u ON u.id = r.user_id
-        {where_clause}
-        ORDER BY r.created_at DESC
+        WHERE {' AND '.join(page_filters)}
+        ORDER BY {sort_col} {order}, r.id {order}
+        LIMIT ? OFFSET ?
         """
+    page_params.extend([limit, offset])
 
-    reclamations = db.execute(query, params).fetchall()
+    reclamations = db.execute(query, page_params).fetchall()
     db.close()
 
+    has_more = len(reclamations) > per_page
+    reclamations = reclamations[:per_page]
+    if before:
+        reclamations.reverse()
+
+    link_args = _filter_args(args)
+    export_args = dict(link_args)
+    if per_page != DASHBOARD_PAGE_SIZE:
+        link_args["per_page"] = per_page
+    if count_arg is not None:
+        link_args["count"] = count_arg
+
+    next_url = None
+    prev_url = None
+    if page:
+        if has_more:
+            next_url = url_for("reclamation.dashboard", page=page + 1, **link_args)
+        if page > 1:
+            prev_url = url_for("reclamation.dashboard", page=page - 1, **link_args)
+    elif reclamations:
+        first, last = reclamations[0], reclamations[-1]
+        if has_more or before:
+            next_url = url_for(
+                "reclamation.dashboard",
+                after=_encode_cursor(last["sort_key"], last["id"]),
+                **link_args,
+            )
+        if after or (before and has_more):
+            prev_url = url_for(
+                "reclamation.dashboard",
+                before=_encode_cursor(first["sort_key"], first["id"]),
+                **link_args,
+            )
+
     return render_template(
         "dashboard.html",
         reclamations=reclamations,
         types=types,
         bureaux=bureaux,
-        statut=statut,
-        bureau_id=bureau_id,
-        type_id=type_id,
-        search=search,
-        archived=archived,
+        statut=args["statut"],
+        bureau_id=args["bureau_id"],
+        type_id=args["type_id"],
+        search=args["search"],
+        archived=args["archived"],
+        per_page=per_page,
+        total=total,
+        next_url=next_url,
+        prev_url=prev_url,
+        export_csv_url=url_for("reclamation.export_dashboard", format="csv", **export_args),
+        export_xlsx_url=url_for("reclamation.export_dashboard", format="xlsx", **export_args),
+    )
+
+EXPORT_COLUMNS = [
+    ("numero_dossier", "Numero"),
+    ("created_at", "Date"),
+    ("statut", "Statut"),
+    ("nom_client", "Client"),
+    ("numero_compte", "Compte"),
+    ("libelle", "Type"),
+    ("nom_bureau", "Bureau"),
+    ("username", "Soumis par"),
+    ("ancienne_valeur", "Ancienne info"),
+    ("nouvelle_valeur", "Nouvelle info"),
+    ("motif", "Motif"),
+    ("observation", "Observation"),
+]
+
+def _export_cell(value):
+    if value is None:
+        return ""
+    return value if isinstance(value, (int, float)) else str(value)
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=EXPORT_CSV_DELIMITER)
+    # BOM so Excel detects UTF-8.
+    buffer.write("\ufeff")
+    writer.writerow([label for _, label in EXPORT_COLUMNS])
+    for rows in batches:
+        for row in rows:
+            writer.writerow([_export_cell(row[key]) for key, _ in EXPORT_COLUMNS])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def _xlsx_chunks(batches):
+    # Write-only workbooks keep rows on disk; the finished file is spooled
+    # to a temporary file and streamed back in chunks.
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Reclamations")
+    ws.append([label for _, label in EXPORT_COLUMNS])
+    for rows in batches:
+        for row in rows:
+            ws.append([_export_cell(row[key]) for key, _ in EXPORT_COLUMNS])
+    with tempfile.TemporaryFile() as out:
+        wb.save(out)
+        out.seek(0)
+        while True:
+            chunk = out.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def _export_batches(query, params):
+    # The request's connection is released before the body is streamed, so
+    # the export holds its own until the last batch is written.
+    with connect_db(readonly=True) as db:
+        yield from db.iter_batches(query, params, EXPORT_BATCH_SIZE)
+
+@reclamation_bp.route("/dashboard/export", methods=["GET"])
+@login_required
+def export_dashboard():
+    export_format = request.args.get("format", "csv")
+    if export_format not in ("csv", "xlsx"):
+        abort(400)
+
+    db = get_db()
+    args, source, _, filters, params = _dashboard_filters(db)
+    query = f"""
+        SELECT r.numero_dossier, r.created_at, r.statut, r.nom_client, r.numero_compte,
+               t.libelle, b.nom_bureau, u.username, r.ancienne_valeur, r.nouvelle_valeur,
+               r.motif, r.observation
+        FROM {source}
+        LEFT JOIN bureaux b ON b.id = r.bureau_id
+        LEFT JOIN types_reclamation t ON t.id = r.type_id
+        LEFT JOIN users u ON u.id = r.user_id
+        WHERE {' AND '.join(filters)}
+        ORDER BY r.created_at DESC, r.id DESC
+        """
+    db.close()
+    batches = _export_batches(query, params)
+    stamp = now_local().strftime("%Y%m%d_%H%M%S")
+    if export_format == "csv":
+        body = _csv_chunks(batches)
+        mimetype = "text/csv; charset=utf-8"
+    else:
+        body = _xlsx_chunks(batches)
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return Response(
+        body,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=reclamations_{stamp}.{export_format}"},
     )
 
 @reclamation_bp.route("/reclamation/new", methods=["GET", "POST"])
@@ -137,127 +368,55 @@ def dashboard():
 @role_required("agent")
 def new_reclamation():
     error = None
-    db = get_db()
-    types = db.execute(
-        "SELECT id, libelle FROM types_reclamation WHERE actif = 1 ORDER BY libelle"
-    ).fetchall()
-    db.close()
+    types = refdata.active_types()
 
     if request.method == "POST":
-        numero_compte = request.form.get("numero_compte", "").strip()
-        nom_client = request.form.get("nom_client", "").strip()
-        type_id = request.form.get("type_id") or None
-        ancienne_valeur = request.form.get("ancienne_valeur", "").strip()
-        nouvelle_valeur = request.form.get("nouvelle_valeur", "").strip()
-        motif = request.form.get("motif", "").strip()
-
-        if not numero_compte or not nom_client or not type_id:
-            error = "Veuillez remplir tous les champs."
-        else:
-            if not motif:
-                db = get_db()
-                type_row = db.execute(
-                    "SELECT code FROM types_reclamation WHERE id = ?",
-                    (type_id,),
-                ).fetchone()
-                db.close()
-                if type_row and type_row["code"] == "AUTRE":
-                    error = "Le motif est obligatoire pour le type Autre."
-                else:
-                    motif = ""
-            if error:
-                return render_template(
-                    "reclamation_form.html",
-                    error=error,
-                    types=types,
-                    numero_compte=numero_compte,
-                    nom_client=nom_client,
-                    type_id=type_id,
-                    ancienne_valeur=ancienne_valeur,
-                    nouvelle_valeur=nouvelle_valeur,
-                    motif=motif,
-                )
-            db = get_db()
-            if is_postgres():
-                cur = db.execute(
-                    """
-                    INSERT INTO reclamations (
-                        user_id, bureau_id, type_id, numero_compte,
-                        nom_client, ancienne_valeur, nouvelle_valeur, motif
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    RETURNING id
-                    """,
-                    (
-                        current_user.id,
-                        current_user.bureau_id,
-                        type_id,
-                        numero_compte,
-                        nom_client,
-                        ancienne_valeur,
-                        nouvelle_valeur,
-                        motif,
-                    ),
-                )
-                reclamation_id = cur.fetchone()["id"]
-            else:
-                cur = db.execute(
-                    """
-                    INSERT INTO reclamations (
-                        user_id, bureau_id, type_id, numero_compte,
-                        nom_client, ancienne_valeur, nouvelle_valeur, motif
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        current_user.id,
-                        current_user.bureau_id,
-                        type_id,
-                        numero_compte,
-                        nom_client,
-                        ancienne_valeur,
-                        nouvelle_valeur,
-                        motif,
-                    ),
-                )
-                reclamation_id = cur.lastrowid
-            numero_dossier = f"REC-{now_local().strftime('%Y%m%d')}-{reclamation_id:05d}"
-            db.execute(
-                "UPDATE reclamations SET numero_dossier = ? WHERE id = ?",
-                (numero_dossier, reclamation_id),
-            )
-            created_at = now_local_str()
-            db.execute(
-                "UPDATE reclamations SET created_at = ? WHERE id = ?",
-                (created_at, reclamation_id),
-            )
-            db.execute(
-                """
-                INSERT INTO historique_statut (reclamation_id, ancien_statut, nouveau_statut, observation, user_id, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (reclamation_id, None, "EN_ATTENTE", "Creation", current_user.id, created_at),
-            )
-
-            files = request.files.getlist("pieces")
-            for f in files:
+        entry, error = reclamation_store.validate(request.form, current_user.bureau_id)
+        if not error:
+            # Uploads are stored and hashed before the write transaction
+            # starts, so other writers never wait on a file transfer.
+            uploads = []
+            for f in request.files.getlist("pieces"):
                 if not f or f.filename == "":
                     continue
                 if not _allowed_file(f.filename):
                     continue
                 safe_name = secure_filename(f.filename)
-                unique_name = f"{uuid4().hex}_{safe_name}"
-                f.save(os.path.join(current_app.config["UPLOAD_FOLDER"], unique_name))
+                sha256, size = storage.save_upload(f)
+                uploads.append((f"{uuid4().hex}_{safe_name}", safe_name, sha256, size))
+
+            db = get_db()
+            created = reclamation_store.insert_reclamations(db, [entry], current_user.id)[0]
+            reclamation_id = created["id"]
+            numero_dossier = created["numero_dossier"]
+            created_at = created["created_at"]
+
+            images_to_process = []
+            for unique_name, safe_name, sha256, size in uploads:
+                storage.add_ref(db, sha256, size)
                 db.execute(
                     """
-                    INSERT INTO pieces_jointes (reclamation_id, filename, original_name, uploaded_at)
-                    VALUES (?, ?, ?, ?)
+                    INSERT INTO pieces_jointes (reclamation_id, filename, original_name, uploaded_at, sha256)
+                    VALUES (?, ?, ?, ?, ?)
                     """,
-                    (reclamation_id, unique_name, safe_name, created_at),
+                    (reclamation_id, unique_name, safe_name, created_at, sha256),
                 )
+                if images.is_image(safe_name):
+                    images_to_process.append(sha256)
 
             db.commit()
             db.close()
+            for sha256 in images_to_process:
+                images.submit(sha256)
+            publish(
+                "reclamation_created",
+                {
+                    "reclamation_id": reclamation_id,
+                    "numero_dossier": numero_dossier,
+                    "pending_reclamations": 1,
+                },
+                roles=STAFF_ROLES,
+            )
             return redirect(url_for("reclamation.dashboard"))
 
     return render_template(
@@ -272,6 +431,50 @@ def new_reclamation():
         motif=request.form.get("motif", ""),
     )
 
+@reclamation_bp.route("/api/reclamations", methods=["POST"])
+@login_required
+@role_required("agent")
+def create_reclamations_batch():
+    # Body: a JSON array of reclamations (same fields as the form, type_id
+    # included). All-or-nothing: any invalid item rejects the whole batch.
+    items = request.get_json(silent=True)
+    if isinstance(items, dict):
+        items = items.get("reclamations")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Un tableau JSON de reclamations est attendu."}), 400
+    if len(items) > API_BATCH_MAX:
+        return jsonify({"error": f"Au plus {API_BATCH_MAX} reclamations par requete."}), 413
+
+    entries = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "Objet JSON attendu."})
+            continue
+        entry, error = reclamation_store.validate(item, current_user.bureau_id)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            entries.append(entry)
+    if errors:
+        return jsonify({"errors": errors}), 400
+
+    db = get_db()
+    created = reclamation_store.insert_reclamations(db, entries, current_user.id)
+    db.commit()
+    db.close()
+    publish(
+        "reclamation_created",
+        {
+            "numero_dossier": created[-1]["numero_dossier"],
+            "pending_reclamations": len(created),
+        },
+        roles=STAFF_ROLES,
+    )
+    return jsonify(
+        {"created": [{"id": c["id"], "numero_dossier": c["numero_dossier"]} for c in created]}
+    ), 201
+
 @reclamation_bp.route("/reclamation/<int:reclamation_id>", methods=["GET"])
 @login_required
 def view_reclamation(reclamation_id):
@@ -296,7 +499,7 @@ def view_reclamation(reclamation_id):
         abort(403)
 
     pieces = db.execute(
-        "SELECT id, filename, original_name, uploaded_at FROM pieces_jointes WHERE reclamation_id = ?",
+        "SELECT id, filename, original_name, uploaded_at, sha256 FROM pieces_jointes WHERE reclamation_id = ?",
         (reclamation_id,),
     ).fetchall()
     historique = db.execute(
@@ -312,17 +515,24 @@ def view_reclamation(reclamation_id):
     db.close()
 
     now = now_local()
-    disabled_until = _parse_dt(reclamation["reminder_disabled_until"])
+    disabled_until = parse_dt(reclamation["reminder_disabled_until"])
     reminder_disabled = bool(disabled_until and disabled_until > now)
     reminder_remaining_min = None
     if reminder_disabled:
         seconds = max(0, int((disabled_until - now).total_seconds()))
         reminder_remaining_min = max(1, math.ceil(seconds / 60))
 
+    previews = {
+        p["id"]
+        for p in pieces
+        if p["sha256"] and images.available() and images.is_image(p["original_name"])
+    }
+
     return render_template(
         "reclamation_detail.html",
         reclamation=reclamation,
         pieces=pieces,
+        previews=previews,
         historique=historique,
         reminder_disabled=reminder_disabled,
         reminder_remaining_min=reminder_remaining_min,
@@ -354,7 +564,7 @@ def send_reminder(reclamation_id):
         return redirect(url_for("reclamation.view_reclamation", reclamation_id=reclamation_id))
 
     now = now_local()
-    disabled_until = _parse_dt(reclamation["reminder_disabled_until"])
+    disabled_until = parse_dt(reclamation["reminder_disabled_until"])
     if disabled_until and disabled_until > now:
         remaining = max(1, math.ceil((disabled_until - now).total_seconds() / 60))
         db.close()
@@ -387,6 +597,7 @@ def send_reminder(reclamation_id):
     )
     db.commit()
     db.close()
+    schedule_reminder(reclamation_id, auto_at)
     flash("Rappel envoye. Un rappel automatique sera lance dans 1 heure si non traitee.", "success")
     return redirect(url_for("reclamation.view_reclamation", reclamation_id=reclamation_id))
 
@@ -402,7 +613,7 @@ def update_status(reclamation_id):
 
     db = get_db()
     current = db.execute(
-        "SELECT statut, numero_dossier, user_id FROM reclamations WHERE id = ?",
+        "SELECT statut, numero_dossier, user_id, archived FROM reclamations WHERE id = ?",
         (reclamation_id,),
     ).fetchone()
     if not current:
@@ -430,13 +641,15 @@ def update_status(reclamation_id):
             """,
             (new_status, observation, now_local_str(), reclamation_id),
         )
+    changed_at = now_local_str()
     db.execute(
         """
         INSERT INTO historique_statut (reclamation_id, ancien_statut, nouveau_statut, observation, user_id, created_at)
         VALUES (?, ?, ?, ?, ?, ?)
         """,
-        (reclamation_id, current["statut"], new_status, observation, current_user.id, now_local_str()),
+        (reclamation_id, current["statut"], new_status, observation, current_user.id, changed_at),
     )
+    counters.bump(db, counters.status_changed(current["statut"], new_status, current["archived"] == 1))
     # Notify requester (desktop notification on server machine)
     try:
         requester = db.execute(
@@ -459,6 +672,24 @@ def update_status(reclamation_id):
         pass
     db.commit()
     db.close()
+    if new_status == "TRAITEE":
+        cancel_reminder(reclamation_id)
+    pending_delta = 0
+    if current["archived"] != 1 and new_status != current["statut"]:
+        pending_delta = (new_status == "EN_ATTENTE") - (current["statut"] == "EN_ATTENTE")
+    publish(
+        "status_changed",
+        {
+            "reclamation_id": reclamation_id,
+            "numero_dossier": current["numero_dossier"],
+            "ancien_statut": current["statut"],
+            "nouveau_statut": new_status,
+            "created_at": changed_at,
+            "pending_reclamations": pending_delta,
+        },
+        roles=STAFF_ROLES,
+        user_id=current["user_id"],
+    )
     return redirect(url_for("reclamation.view_reclamation", reclamation_id=reclamation_id))
 
 @reclamation_bp.route("/reclamation/<int:reclamation_id>/archive", methods=["POST"])
@@ -490,6 +721,7 @@ def archive_reclamation(reclamation_id):
     )
     db.commit()
     db.close()
+    cancel_reminder(reclamation_id)
     return redirect(url_for("reclamation.dashboard"))
 
 @reclamation_bp.route("/reclamation/<int:reclamation_id>/unarchive", methods=["POST"])
@@ -498,7 +730,7 @@ def archive_reclamation(reclamation_id):
 def unarchive_reclamation(reclamation_id):
     db = get_db()
     row = db.execute(
-        "SELECT archived FROM reclamations WHERE id = ?",
+        "SELECT archived, statut FROM reclamations WHERE id = ?",
         (reclamation_id,),
     ).fetchone()
     if not row:
@@ -512,6 +744,7 @@ def unarchive_reclamation(reclamation_id):
         "UPDATE reclamations SET archived = 0, updated_at = ? WHERE id = ?",
         (now_local_str(), reclamation_id),
     )
+    counters.bump(db, {"pending_reclamations": int(row["statut"] == "EN_ATTENTE")})
     db.execute(
         """
         INSERT INTO historique_statut (reclamation_id, ancien_statut, nouveau_statut, observation, user_id, created_at)
@@ -523,27 +756,105 @@ def unarchive_reclamation(reclamation_id):
     db.close()
     return redirect(url_for("reclamation.dashboard", archived=1))
 
+def _send_piece(path, download_name, etag=True):
+    environ = request.environ
+    if DOWNLOAD_OFFLOAD:
+        # The proxy serves Range requests itself from the full file.
+        environ = dict(environ)
+        environ.pop("HTTP_RANGE", None)
+    rv = werkzeug_send_file(
+        path,
+        environ,
+        as_attachment=True,
+        download_name=download_name,
+        etag=etag,
+        max_age=DOWNLOAD_MAX_AGE,
+        use_x_sendfile=bool(DOWNLOAD_OFFLOAD),
+        response_class=current_app.response_class,
+    )
+    # Attachments sit behind a login: only the user's own browser may cache them.
+    rv.cache_control.public = False
+    rv.cache_control.private = True
+    if DOWNLOAD_OFFLOAD == "x-accel" and "X-Sendfile" in rv.headers:
+        relative = os.path.relpath(rv.headers.pop("X-Sendfile"), current_app.config["UPLOAD_FOLDER"])
+        rv.headers["X-Accel-Redirect"] = f"{DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{relative.replace(os.sep, '/')}"
+    return rv
+
 @reclamation_bp.route("/uploads/<path:filename>", methods=["GET"])
 @login_required
 def download_piece(filename):
+    if storage.is_sha256(filename):
+        # Served by content hash: allowed if any piece with these bytes is visible.
+        where = "p.sha256 = ?"
+    else:
+        where = "p.filename = ?"
+    query = f"""
+        SELECT p.original_name, p.sha256, r.user_id
+        FROM pieces_jointes p
+        JOIN reclamations r ON r.id = p.reclamation_id
+        WHERE {where}
+        """
+    params = [filename]
+    if current_user.role == "agent":
+        query += " ORDER BY CASE WHEN r.user_id = ? THEN 0 ELSE 1 END"
+        params.append(current_user.id)
     db = get_db()
-    piece = db.execute(
-        "SELECT reclamation_id FROM pieces_jointes WHERE filename = ?",
-        (filename,),
-    ).fetchone()
+    piece = db.execute(query + " LIMIT 1", params).fetchone()
+    db.close()
+
     if not piece:
-        db.close()
         abort(404)
+    if current_user.role == "agent" and str(piece["user_id"]) != str(current_user.id):
+        abort(403)
 
-    reclamation = db.execute(
-        "SELECT user_id FROM reclamations WHERE id = ?",
-        (piece["reclamation_id"],),
+    if not piece["sha256"]:
+        path = safe_join(current_app.config["UPLOAD_FOLDER"], filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        return _send_piece(path, os.path.basename(filename))
+    path = storage.blob_path(piece["sha256"])
+    if not os.path.isfile(path):
+        abort(404)
+    # The content hash is a strong validator for If-None-Match and If-Range.
+    return _send_piece(path, piece["original_name"] or piece["sha256"], etag=piece["sha256"])
+
+@reclamation_bp.route("/pieces/<int:piece_id>/<variant>", methods=["GET"])
+@login_required
+def piece_preview(piece_id, variant):
+    if variant not in images.VARIANTS:
+        abort(404)
+    db = get_db()
+    piece = db.execute(
+        """
+        SELECT p.original_name, p.sha256, r.user_id
+        FROM pieces_jointes p
+        JOIN reclamations r ON r.id = p.reclamation_id
+        WHERE p.id = ?
+        """,
+        (piece_id,),
     ).fetchone()
     db.close()
 
-    if not reclamation:
+    if not piece or not piece["sha256"] or not images.is_image(piece["original_name"]):
         abort(404)
-    if current_user.role == "agent" and str(reclamation["user_id"]) != str(current_user.id):
+    if current_user.role == "agent" and str(piece["user_id"]) != str(current_user.id):
         abort(403)
 
-    return send_from_directory(current_app.config["UPLOAD_FOLDER"], filename, as_attachment=True)
+    try:
+        path = images.get_variant(piece["sha256"], variant)
+    except images.DECODE_ERRORS as exc:
+        print(f"[IMAGES] {piece['sha256']}: {exc}")
+        path = None
+    if not path:
+        abort(404)
+    rv = werkzeug_send_file(
+        path,
+        request.environ,
+        mimetype="image/jpeg",
+        etag=f"{piece['sha256']}-{variant}",
+        max_age=DOWNLOAD_MAX_AGE,
+        response_class=current_app.response_class,
+    )
+    rv.cache_control.public = False
+    rv.cache_control.private = True
+    return rv
@@ -0,0 +1,69 @@
+import threading
+import time
+from config import REFDATA_TTL_SECONDS
+from database import get_db
+
+# Reference tables change only through the admin pages, which call invalidate().
+# The TTL covers changes made by another process (init_db, a second worker).
+_LOADERS = {
+    "types": (
+        "SELECT id, code, libelle, actif FROM types_reclamation ORDER BY libelle",
+        "code",
+    ),
+    "bureaux": (
+        "SELECT id, code_bureau, nom_bureau, province FROM bureaux ORDER BY nom_bureau",
+        "code_bureau",
+    ),
+}
+
+_lock = threading.Lock()
+_cache = {}
+_generation = 0
+
+class RefTable:
+    def __init__(self, rows, code_key):
+        self.rows = rows
+        self.by_id = {row["id"]: row for row in rows}
+        self.by_code = {row[code_key]: row for row in rows}
+
+    def get(self, row_id):
+        try:
+            return self.by_id.get(int(row_id))
+        except (TypeError, ValueError):
+            return None
+
+def _load(name):
+    sql, code_key = _LOADERS[name]
+    with get_db(primary=True) as db:
+        rows = [dict(row) for row in db.execute(sql).fetchall()]
+    return RefTable(rows, code_key)
+
+def _get(name):
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(name)
+        generation = _generation
+    if entry and now - entry[0] < REFDATA_TTL_SECONDS:
+        return entry[1]
+    table = _load(name)
+    with _lock:
+        # Don't store a table loaded before an invalidate() that raced with us.
+        if generation == _generation:
+            _cache[name] = (now, table)
+    return table
+
+def types():
+    return _get("types")
+
+def bureaux():
+    return _get("bureaux")
+
+def active_types():
+    return [row for row in types().rows if row["actif"] == 1]
+
+def invalidate(*names):
+    global _generation
+    with _lock:
+        _generation += 1
+        for name in names or list(_LOADERS):
+            _cache.pop(name, None)
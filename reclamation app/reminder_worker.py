@@ -1,68 +1,190 @@
+import heapq
 import threading
-import time
 from datetime import timedelta
 
+from config import REMINDER_RESYNC_SECONDS, REMINDER_BATCH_SIZE, REMINDER_RETRY_SECONDS
 from database import get_db
 from notifications import send_desktop_notification
-from time_utils import now_local, now_local_str
+from time_utils import now_local, now_local_str, parse_dt
 
-POLL_SECONDS = 30
+# Pending automatic reminders, ordered by reminder_auto_at. send_reminder and
+# update_status keep it current; the database stays the source of truth and is
+# only read when a deadline passes (or on the optional periodic resync).
+class ReminderSchedule:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._due = {}
+
+    def schedule(self, reclamation_id, due_at):
+        due_at = parse_dt(due_at)
+        if due_at is None:
+            return
+        with self._cond:
+            self._due[reclamation_id] = due_at
+            heapq.heappush(self._heap, (due_at, reclamation_id))
+            self._cond.notify()
+
+    def retry(self, reclamation_ids, due_at):
+        # Puts back reminders whose processing failed, unless send_reminder or
+        # update_status rescheduled them in the meantime.
+        with self._cond:
+            for reclamation_id in reclamation_ids:
+                if reclamation_id not in self._due:
+                    self._due[reclamation_id] = due_at
+                    heapq.heappush(self._heap, (due_at, reclamation_id))
+            self._cond.notify()
+
+    def cancel(self, reclamation_id):
+        # Stale heap entries are skipped when they reach the top.
+        with self._cond:
+            self._due.pop(reclamation_id, None)
+
+    def merge(self, entries):
+        # Adds reminders loaded from the database. Entries already in memory
+        # win: send_reminder or update_status may have moved them after the
+        # read, and a stale one only costs a wake-up since processing re-reads
+        # the database.
+        with self._cond:
+            for reclamation_id, due_at in entries:
+                if reclamation_id not in self._due:
+                    self._due[reclamation_id] = due_at
+                    heapq.heappush(self._heap, (due_at, reclamation_id))
+            self._cond.notify()
+
+    def wait(self, timeout):
+        with self._cond:
+            self._drop_stale()
+            if self._heap:
+                delay = (self._heap[0][0] - now_local()).total_seconds()
+                timeout = delay if timeout is None else min(timeout, delay)
+            if timeout is None or timeout > 0:
+                self._cond.wait(timeout)
+
+    def pop_due(self, now):
+        due = []
+        with self._cond:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, reclamation_id = heapq.heappop(self._heap)
+                self._due.pop(reclamation_id, None)
+                due.append(reclamation_id)
+                self._drop_stale()
+        return due
+
+    def _drop_stale(self):
+        while self._heap:
+            due_at, reclamation_id = self._heap[0]
+            if self._due.get(reclamation_id) == due_at:
+                return
+            heapq.heappop(self._heap)
+
+schedule = ReminderSchedule()
+
+def schedule_reminder(reclamation_id, due_at):
+    schedule.schedule(reclamation_id, due_at)
+
+def cancel_reminder(reclamation_id):
+    schedule.cancel(reclamation_id)
+
+def _load_schedule():
+    with get_db() as db:
+        rows = db.execute(
+            """
+            SELECT id, reminder_auto_at
+            FROM reclamations
+            WHERE archived = 0
+              AND statut != 'TRAITEE'
+              AND reminder_auto_at IS NOT NULL
+              AND reminder_auto_sent_at IS NULL
+            """
+        ).fetchall()
+    schedule.merge(
+        (row["id"], parse_dt(row["reminder_auto_at"]))
+        for row in rows
+        if parse_dt(row["reminder_auto_at"]) is not None
+    )
 
 def _run_loop():
     while True:
         try:
-            _process_due_reminders()
+            _load_schedule()
+            break
+        except Exception as exc:
+            print(f"[REMINDER_WORKER] error: {exc}")
+            schedule.wait(REMINDER_RESYNC_SECONDS or 60)
+
+    last_resync = now_local()
+    while True:
+        schedule.wait(REMINDER_RESYNC_SECONDS or None)
+        try:
+            now = now_local()
+            if REMINDER_RESYNC_SECONDS and (now - last_resync).total_seconds() >= REMINDER_RESYNC_SECONDS:
+                _load_schedule()
+                last_resync = now
+            due = schedule.pop_due(now)
+            if due:
+                try:
+                    _process_due_reminders()
+                except Exception:
+                    schedule.retry(due, now_local() + timedelta(seconds=REMINDER_RETRY_SECONDS))
+                    raise
         except Exception as exc:
             print(f"[REMINDER_WORKER] error: {exc}")
-        time.sleep(POLL_SECONDS)
 
 def _process_due_reminders():
-    db = get_db()
-    rows = db.execute(
-        """
-        SELECT id, numero_dossier, nom_client, statut
-        FROM reclamations
-        WHERE archived = 0
-          AND statut != 'TRAITEE'
-          AND reminder_auto_at IS NOT NULL
-          AND reminder_auto_sent_at IS NULL
-          AND reminder_auto_at <= ?
-        """
-        ,
-        (now_local_str(),),
-    ).fetchall()
-
-    if not rows:
-        db.close()
-        return
-
-    now = now_local()
-    disabled_until = now + timedelta(minutes=30)
+    with get_db() as db:
+        rows = db.execute(
+            """
+            SELECT id, numero_dossier, nom_client, statut
+            FROM reclamations
+            WHERE archived = 0
+              AND statut != 'TRAITEE'
+              AND reminder_auto_at IS NOT NULL
+              AND reminder_auto_sent_at IS NULL
+              AND reminder_auto_at <= ?
+            """
+            ,
+            (now_local_str(),),
+        ).fetchall()
+
+        if not rows:
+            return
 
+        now = now_local()
+        disabled_until = now + timedelta(minutes=30)
+
+        ids = [row["id"] for row in rows]
+        for start in range(0, len(ids), REMINDER_BATCH_SIZE):
+            batch = ids[start:start + REMINDER_BATCH_SIZE]
+            placeholders = ", ".join(["?"] * len(batch))
+            db.execute(
+                f"""
+                UPDATE reclamations
+                SET reminder_auto_sent_at = ?,
+                    reminder_last_sent_at = ?,
+                    reminder_disabled_until = ?
+                WHERE id IN ({placeholders})
+                  AND reminder_auto_sent_at IS NULL
+                """,
+                [
+                    now_local_str(),
+                    now_local_str(),
+                    disabled_until.strftime("%Y-%m-%d %H:%M:%S"),
+                    *batch,
+                ],
+            )
+
+        db.commit()
+
+    # Only once the sent flags are stored, so a failed batch is not announced
+    # again when it is retried.
     for row in rows:
         title = "Rappel automatique"
         message = (
             f"La reclamation {row['numero_dossier']} n'a pas encore ete traitee."
         )
         send_desktop_notification(title, message)
-        db.execute(
-            """
-            UPDATE reclamations
-            SET reminder_auto_sent_at = ?,
-                reminder_last_sent_at = ?,
-                reminder_disabled_until = ?
-            WHERE id = ?
-            """,
-            (
-                now_local_str(),
-                now_local_str(),
-                disabled_until.strftime("%Y-%m-%d %H:%M:%S"),
-                row["id"],
-            ),
-        )
-
-    db.commit()
-    db.close()
 
 def start_reminder_worker(app=None):
     thread = threading.Thread(target=_run_loop, daemon=True)
@@ -0,0 +1,161 @@
+import re
+from database import is_postgres
+
+_search_ready = None
+
+def _savepoint(db, name, statements):
+    db.execute(f"SAVEPOINT {name}")
+    try:
+        for stmt in statements:
+            db.execute(stmt)
+    except Exception:
+        db.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        return False
+    db.execute(f"RELEASE SAVEPOINT {name}")
+    return True
+
+def _setup_sqlite(db):
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reclamations_fts'"
+    ).fetchone()
+    if exists:
+        return True
+    try:
+        db.execute(
+            """
+            CREATE VIRTUAL TABLE reclamations_fts USING fts5(
+                numero_dossier, numero_compte, nom_client, motif,
+                content='reclamations',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+            """
+        )
+    except Exception:
+        # SQLite built without FTS5: the dashboard keeps the LIKE search.
+        return False
+    db.executescript("""
+    CREATE TRIGGER IF NOT EXISTS reclamations_fts_ai AFTER INSERT ON reclamations BEGIN
+        INSERT INTO reclamations_fts (rowid, numero_dossier, numero_compte, nom_client, motif)
+        VALUES (new.id, new.numero_dossier, new.numero_compte, new.nom_client, new.motif);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS reclamations_fts_ad AFTER DELETE ON reclamations BEGIN
+        INSERT INTO reclamations_fts (reclamations_fts, rowid, numero_dossier, numero_compte, nom_client, motif)
+        VALUES ('delete', old.id, old.numero_dossier, old.numero_compte, old.nom_client, old.motif);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS reclamations_fts_au
+    AFTER UPDATE OF numero_dossier, numero_compte, nom_client, motif ON reclamations BEGIN
+        INSERT INTO reclamations_fts (reclamations_fts, rowid, numero_dossier, numero_compte, nom_client, motif)
+        VALUES ('delete', old.id, old.numero_dossier, old.numero_compte, old.nom_client, old.motif);
+        INSERT INTO reclamations_fts (rowid, numero_dossier, numero_compte, nom_client, motif)
+        VALUES (new.id, new.numero_dossier, new.numero_compte, new.nom_client, new.motif);
+    END;
+    """)
+    db.execute("INSERT INTO reclamations_fts (reclamations_fts) VALUES ('rebuild')")
+    return True
+
+def _setup_postgres(db):
+    # unaccent may need a superuser; without it the dashboard keeps the LIKE search.
+    if not _savepoint(db, "search_ext", ["CREATE EXTENSION IF NOT EXISTS unaccent"]):
+        return False
+    # Statements are run one by one: the function body contains semicolons.
+    return _savepoint(
+        db,
+        "search_setup",
+        [
+            "ALTER TABLE reclamations ADD COLUMN IF NOT EXISTS search_vector tsvector",
+            """
+            CREATE OR REPLACE FUNCTION reclamations_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('simple', unaccent(coalesce(NEW.nom_client, ''))), 'A') ||
+                    setweight(to_tsvector('simple', coalesce(NEW.numero_dossier, '') || ' ' || coalesce(NEW.numero_compte, '')), 'A') ||
+                    setweight(to_tsvector('simple', unaccent(coalesce(NEW.motif, ''))), 'B');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            "DROP TRIGGER IF EXISTS reclamations_search_vector ON reclamations",
+            """
+            CREATE TRIGGER reclamations_search_vector
+            BEFORE INSERT OR UPDATE OF numero_dossier, numero_compte, nom_client, motif ON reclamations
+            FOR EACH ROW EXECUTE FUNCTION reclamations_search_vector_update()
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_reclamations_search ON reclamations USING GIN (search_vector)",
+            "UPDATE reclamations SET nom_client = nom_client WHERE search_vector IS NULL",
+        ],
+    )
+
+def init_search(db):
+    global _search_ready
+    if is_postgres():
+        _search_ready = _setup_postgres(db)
+    else:
+        _search_ready = _setup_sqlite(db)
+    return _search_ready
+
+def _search_available(db):
+    global _search_ready
+    if _search_ready is None:
+        if is_postgres():
+            row = db.execute(
+                """
+                SELECT 1
+                FROM information_schema.columns
+                WHERE table_name = 'reclamations' AND column_name = 'search_vector'
+                """
+            ).fetchone()
+        else:
+            row = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reclamations_fts'"
+            ).fetchone()
+        _search_ready = bool(row)
+    return _search_ready
+
+def _terms(search):
+    return re.findall(r"\w+", search.lower())
+
+def _has_identifier(terms):
+    # Account and dossier numbers are searched by any part, not only by prefix.
+    return any(any(ch.isdigit() for ch in term) for term in terms)
+
+# Returns (from_sql, params): a FROM clause to use instead of
+# "reclamations r", exposing s.id and a relevance s.score (higher is better),
+# or None when no full-text index is available. On SQLite, CROSS JOIN keeps
+# the matches as the outer loop: otherwise the planner walks reclamations and
+# runs the FTS5 MATCH again for every row.
+def search_source(db, search):
+    terms = _terms(search)
+    if not terms or not _search_available(db):
+        return None
+    like = f"%{search.strip()}%"
+    if is_postgres():
+        query = " & ".join(f"{term}:*" for term in terms)
+        matches = """
+            SELECT id, ts_rank(search_vector, to_tsquery('simple', unaccent(?))) AS score
+            FROM reclamations
+            WHERE search_vector @@ to_tsquery('simple', unaccent(?))
+        """
+        params = [query, query]
+        substring = "SELECT id, 0 AS score FROM reclamations WHERE numero_dossier ILIKE ? OR numero_compte ILIKE ?"
+        join = "JOIN"
+    else:
+        query = " ".join(f'"{term}"*' for term in terms)
+        matches = """
+            SELECT rowid AS id, -bm25(reclamations_fts, 5.0, 5.0, 10.0, 1.0) AS score
+            FROM reclamations_fts
+            WHERE reclamations_fts MATCH ?
+        """
+        params = [query]
+        substring = "SELECT id, 0 AS score FROM reclamations WHERE numero_dossier LIKE ? OR numero_compte LIKE ?"
+        join = "CROSS JOIN"
+    if _has_identifier(terms):
+        matches = f"""
+            SELECT id, MAX(score) AS score
+            FROM ({matches} UNION ALL {substring}) m
+            GROUP BY id
+        """
+        params = params + [like, like]
+    return f"({matches}) s {join} reclamations r ON r.id = s.id", params
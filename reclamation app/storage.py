@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import time
+from uuid import uuid4
+from config import UPLOAD_FOLDER, UPLOAD_CHUNK_SIZE
+from database import get_db
+from time_utils import now_local_str
+
+# Attachments are stored once per content under blobs/ab/cd/<sha256>;
+# pieces_jointes rows point at them through their sha256 column and the
+# blobs table counts the references.
+BLOB_DIR = os.path.join(UPLOAD_FOLDER, "blobs")
+TMP_DIR = os.path.join(UPLOAD_FOLDER, "tmp")
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def is_sha256(value):
+    return bool(_SHA256_RE.match(value or ""))
+
+def blob_path(sha256):
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+def _store(chunks):
+    os.makedirs(TMP_DIR, exist_ok=True)
+    tmp_path = os.path.join(TMP_DIR, uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+        sha256 = digest.hexdigest()
+        final_path = blob_path(sha256)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+            # Keeps collect_garbage() away from a blob that just gained a reference.
+            os.utime(final_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, size
+
+def _read_chunks(stream):
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def save_upload(file_storage):
+    return _store(_read_chunks(file_storage.stream))
+
+def save_file(path):
+    with open(path, "rb") as stream:
+        return _store(_read_chunks(stream))
+
+def add_ref(db, sha256, size):
+    db.execute(
+        """
+        INSERT INTO blobs (sha256, size, ref_count, created_at) VALUES (?, ?, 1, ?)
+        ON CONFLICT (sha256) DO UPDATE SET ref_count = blobs.ref_count + 1
+        """,
+        (sha256, size, now_local_str()),
+    )
+
+def migrate_legacy(db):
+    # Moves flat uploads/<uuid>_<name> files into the blob store.
+    rows = db.execute(
+        "SELECT id, filename FROM pieces_jointes WHERE sha256 IS NULL"
+    ).fetchall()
+    moved = 0
+    for row in rows:
+        path = os.path.join(UPLOAD_FOLDER, row["filename"])
+        if not os.path.isfile(path):
+            continue
+        sha256, size = save_file(path)
+        add_ref(db, sha256, size)
+        db.execute("UPDATE pieces_jointes SET sha256 = ? WHERE id = ?", (sha256, row["id"]))
+        db.commit()
+        os.remove(path)
+        moved += 1
+    return moved
+
+def collect_garbage(db):
+    # Drops blobs no piece references any more, including files left behind by
+    # a request that failed after writing its upload. Counts are recomputed
+    # from pieces_jointes, so attachments removed directly in the database are
+    # caught too.
+    db.execute(
+        """
+        UPDATE blobs
+        SET ref_count = (SELECT COUNT(*) FROM pieces_jointes p WHERE p.sha256 = blobs.sha256)
+        """
+    )
+    db.execute(
+        """
+        DELETE FROM blobs
+        WHERE ref_count <= 0
+          AND NOT EXISTS (SELECT 1 FROM pieces_jointes p WHERE p.sha256 = blobs.sha256)
+        """
+    )
+    db.commit()
+    referenced = {
+        row["sha256"]
+        for row in db.execute(
+            """
+            SELECT sha256 FROM blobs WHERE ref_count > 0
+            UNION
+            SELECT sha256 FROM pieces_jointes WHERE sha256 IS NOT NULL
+            """
+        ).fetchall()
+    }
+    # Recent files may belong to an upload whose transaction is still open.
+    cutoff = time.time() - 3600
+    removed = 0
+    for root, _, files in os.walk(BLOB_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if is_sha256(name) and name not in referenced and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
+
+if __name__ == "__main__":
+    import sys
+
+    commands = {"migrate": migrate_legacy, "gc": collect_garbage}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print("Usage: python storage.py migrate|gc")
+        sys.exit(1)
+    with get_db() as db:
+        count = commands[sys.argv[1]](db)
+        db.commit()
+    print(f"{sys.argv[1]}: {count} file(s).")
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# config.py reads the environment at import time: point it at a throwaway
+# database and upload folder before any application module is loaded.
+_WORKDIR = tempfile.mkdtemp(prefix="reclamation-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_WORKDIR, "test.db")
+os.environ["UPLOAD_FOLDER"] = os.path.join(_WORKDIR, "uploads")
+os.environ["NOTIFY_SINKS"] = "log"
+os.environ.pop("DATABASE_URL", None)
+os.environ.pop("DATABASE_REPLICA_URL", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "pw"
+
+@pytest.fixture(scope="session")
+def app():
+    from werkzeug.security import generate_password_hash
+    from database import get_db
+    from models import init_db
+    from reclam import app as flask_app
+
+    os.makedirs(os.environ["UPLOAD_FOLDER"], exist_ok=True)
+    init_db()
+    db = get_db()
+    bureau_id = db.execute("SELECT MIN(id) AS id FROM bureaux").fetchone()["id"]
+    for username, role in [("t_admin", "admin"), ("t_agent", "agent"), ("t_sup", "supervisor")]:
+        db.execute(
+            """
+            INSERT INTO users (username, password, role, bureau_id, prenom, nom, matricule, active)
+            VALUES (?, ?, ?, ?, 'Test', 'User', ?, 1)
+            """,
+            (username, generate_password_hash(PASSWORD), role, bureau_id, username),
+        )
+    db.commit()
+    db.close()
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+def _login(app, username):
+    client = app.test_client()
+    response = client.post("/login", data={"username": username, "password": PASSWORD})
+    assert response.status_code == 302
+    return client
+
+@pytest.fixture
+def agent(app):
+    return _login(app, "t_agent")
+
+@pytest.fixture
+def supervisor(app):
+    return _login(app, "t_sup")
+
+@pytest.fixture
+def db(app):
+    from database import connect_db
+
+    conn = connect_db()
+    yield conn
+    conn.close()
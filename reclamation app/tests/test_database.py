@@ -0,0 +1,86 @@
+import pytest
+
+import database
+from database import get_db, pool_stats
+
+def _due_reminder(agent, db):
+    type_id = db.execute(
+        "SELECT id FROM types_reclamation WHERE actif = 1 AND code != 'AUTRE' ORDER BY id LIMIT 1"
+    ).fetchone()["id"]
+    response = agent.post(
+        "/api/reclamations",
+        json=[{"numero_compte": "6665554443", "nom_client": "Rajaonarison Andry", "type_id": type_id}],
+    )
+    reclamation_id = response.get_json()["created"][0]["id"]
+    db.execute(
+        "UPDATE reclamations SET reminder_auto_at = '2000-01-01 00:00:00' WHERE id = ?",
+        (reclamation_id,),
+    )
+    db.commit()
+    return reclamation_id
+
+def test_failed_commit_returns_connection_to_pool(agent, db, monkeypatch):
+    import reminder_worker
+
+    _due_reminder(agent, db)
+    before = pool_stats()
+
+    def failing_commit(self):
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(database.DBConn, "commit", failing_commit)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            reminder_worker._process_due_reminders()
+        stats = pool_stats()
+        assert stats["open"] == before["open"]
+        assert stats["idle"] == before["idle"]
+
+def test_context_manager_rolls_back_on_error(app):
+    with pytest.raises(RuntimeError):
+        with get_db() as db:
+            db.execute("INSERT INTO app_meta (key, value) VALUES ('rolled_back', '1')")
+            raise RuntimeError("boom")
+    assert db.conn is None
+    with get_db() as db:
+        assert db.execute("SELECT 1 FROM app_meta WHERE key = 'rolled_back'").fetchone() is None
+
+def test_failed_writer_frees_the_write_queue(app, monkeypatch):
+    monkeypatch.setattr(database._write_queue, "timeout", 2)
+    with pytest.raises(RuntimeError):
+        with get_db() as db:
+            db.execute("INSERT INTO app_meta (key, value) VALUES ('failed_writer', '1')")
+            raise RuntimeError("writer failed mid-transaction")
+
+    with get_db() as db:
+        db.execute("INSERT INTO app_meta (key, value) VALUES ('next_writer', '1')")
+        db.commit()
+    assert database.write_queue_stats()["timeouts"] == 0
+
+def test_failed_commit_frees_the_write_queue(app, monkeypatch):
+    monkeypatch.setattr(database._write_queue, "timeout", 2)
+
+    class FailingCommit:
+        def __init__(self, conn):
+            self._conn = conn
+
+        def commit(self):
+            raise RuntimeError("disk I/O error")
+
+        def __getattr__(self, name):
+            return getattr(self._conn, name)
+
+    db = get_db()
+    db.conn = FailingCommit(db.conn)
+    db.execute("INSERT INTO app_meta (key, value) VALUES ('failed_commit', '1')")
+    with pytest.raises(RuntimeError):
+        db.commit()
+
+    # The failed writer has not been closed yet: its turn and its SQLite
+    # write lock must already be gone.
+    with get_db() as other:
+        other.execute("INSERT INTO app_meta (key, value) VALUES ('after_failed_commit', '1')")
+        other.commit()
+        assert other.execute("SELECT 1 FROM app_meta WHERE key = 'failed_commit'").fetchone() is None
+    db.conn = db.conn._conn
+    db.close()
@@ -0,0 +1,23 @@
+from events import CounterWatcher, EventBroker
+
+def _counts(reclamations, users=0):
+    return {"pending_reclamations": reclamations, "pending_users": users}
+
+def test_watcher_announces_only_writes_from_other_workers():
+    broker = EventBroker(100)
+    watcher = CounterWatcher(broker)
+    watcher.check(_counts(5))
+
+    # Published here: already pushed by the broker itself.
+    watcher.published({"pending_reclamations": 2})
+    watcher.check(_counts(7))
+    assert broker.last_id() == 0
+
+    # Two more created in another worker, one treated here.
+    watcher.published({"pending_reclamations": -1})
+    watcher.check(_counts(8, users=1))
+    events, _ = broker.wait(0, 0)
+    assert [(e["type"], e["data"]) for e in events] == [
+        ("reclamation_created", {"pending_reclamations": 2}),
+        ("user_registered", {"pending_users": 1}),
+    ]
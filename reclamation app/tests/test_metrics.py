@@ -0,0 +1,26 @@
+import re
+
+def test_prometheus_types_every_family(app):
+    from metrics import prometheus_text
+
+    text = prometheus_text({"db_pool_open": 2, "db_writes_waiting": 0})
+    samples = {re.split(r"[{ ]", line)[0] for line in text.splitlines() if line and not line.startswith("#")}
+    typed = {line.split()[2] for line in text.splitlines() if line.startswith("# TYPE")}
+    helped = {line.split()[2] for line in text.splitlines() if line.startswith("# HELP")}
+    families = {re.sub(r"_(bucket|sum|count)$", "", name) if name.rsplit("_", 1)[0] in typed else name for name in samples}
+    assert families <= typed
+    assert typed == helped
+    assert "# TYPE reclamation_db_pool_open gauge" in text
+
+def test_server_timing_only_for_admins(app, agent):
+    from conftest import _login
+
+    assert "Server-Timing" not in app.test_client().get("/login").headers
+    assert "Server-Timing" not in agent.get("/dashboard").headers
+    assert "Server-Timing" in _login(app, "t_admin").get("/dashboard").headers
+
+def test_server_timing_flag_shows_it_to_everyone(app, monkeypatch):
+    import metrics
+
+    monkeypatch.setattr(metrics, "SERVER_TIMING", True)
+    assert "Server-Timing" in app.test_client().get("/login").headers
@@ -0,0 +1,45 @@
+import sqlite3
+
+import migrate_sqlite_to_postgres as migrate
+
+class _PgCursor:
+    def __init__(self, watermark, pending):
+        self.watermark = watermark
+        self.pending = pending
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        if "sync_watermarks" in sql:
+            self._rows = [self.watermark]
+        else:
+            self._rows = [(piece_id,) for piece_id in self.pending]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return self._rows
+
+def test_sync_recopies_pieces_backfilled_after_migration():
+    sqlite = sqlite3.connect(":memory:")
+    sqlite.execute("CREATE TABLE pieces_jointes (id INTEGER PRIMARY KEY, sha256 TEXT)")
+    sqlite.executemany(
+        "INSERT INTO pieces_jointes (id, sha256) VALUES (?, ?)",
+        [(1, "aa"), (2, "bb"), (3, "cc"), (4, "dd"), (5, None)],
+    )
+    # Pieces 1 to 3 were copied before migrate_legacy backfilled 2.
+    pg_cur = _PgCursor((3, None), pending=[2])
+
+    where, params, upsert = migrate._sync_plan(pg_cur, "pieces_jointes", ["id", "sha256"], 5, True)
+    ids = [row[0] for row in sqlite.execute(f"SELECT id FROM pieces_jointes WHERE {where} ORDER BY id", params)]
+
+    assert ids == [2, 4, 5]
+    assert upsert
+
+def test_sync_appends_when_nothing_is_pending():
+    pg_cur = _PgCursor((3, None), pending=[])
+
+    where, params, upsert = migrate._sync_plan(pg_cur, "pieces_jointes", ["id", "sha256"], 5, True)
+
+    assert params == [3, 5]
+    assert not upsert
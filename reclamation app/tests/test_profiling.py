@@ -0,0 +1,15 @@
+import cProfile
+
+def test_samples_in_the_same_second_are_kept(app, tmp_path, monkeypatch):
+    import profiling
+
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_KEEP", 3)
+    for _ in range(5):
+        profiling._write("reclamation.dashboard", 0.012, cProfile.Profile(), None, None)
+
+    profiles = profiling.list_profiles()
+    assert len(profiles) == 3
+    assert len({profile["name"] for profile in profiles}) == 3
+    assert all(profile["endpoint"] == "reclamation-dashboard" for profile in profiles)
+    assert len(profiles[0]["taken_at"]) == len("20240101-120000")
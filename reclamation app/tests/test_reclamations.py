@@ -0,0 +1,66 @@
+import hashlib
+import io
+
+def test_uploads_are_stored_outside_the_write_transaction(agent, db, monkeypatch):
+    import database
+    import storage
+
+    type_id = db.execute(
+        "SELECT id FROM types_reclamation WHERE actif = 1 AND code != 'AUTRE' ORDER BY id LIMIT 1"
+    ).fetchone()["id"]
+    save_upload = storage.save_upload
+    writers_during_upload = []
+
+    def spy(file_storage):
+        queue = database._write_queue
+        writers_during_upload.append(queue._next_ticket - queue._serving - len(queue._abandoned))
+        return save_upload(file_storage)
+
+    monkeypatch.setattr(storage, "save_upload", spy)
+    response = agent.post(
+        "/reclamation/new",
+        data={
+            "numero_compte": "7778889990",
+            "nom_client": "Andriamihaja Lalaina",
+            "type_id": str(type_id),
+            "pieces": (io.BytesIO(b"%PDF-1 upload"), "releve.pdf"),
+        },
+        content_type="multipart/form-data",
+    )
+
+    assert response.status_code == 302
+    assert writers_during_upload == [0]
+    piece = db.execute(
+        """
+        SELECT p.sha256 FROM pieces_jointes p
+        JOIN reclamations r ON r.id = p.reclamation_id
+        WHERE r.numero_compte = '7778889990'
+        """
+    ).fetchone()
+    assert piece["sha256"] == hashlib.sha256(b"%PDF-1 upload").hexdigest()
+
+def test_preview_of_corrupt_image_is_not_found(agent, db):
+    type_id = db.execute(
+        "SELECT id FROM types_reclamation WHERE actif = 1 AND code != 'AUTRE' ORDER BY id LIMIT 1"
+    ).fetchone()["id"]
+    response = agent.post(
+        "/reclamation/new",
+        data={
+            "numero_compte": "8889990001",
+            "nom_client": "Rakotomalala Faly",
+            "type_id": str(type_id),
+            "pieces": (io.BytesIO(b"\xff\xd8 not really a jpeg"), "photo.jpg"),
+        },
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 302
+    piece_id = db.execute(
+        """
+        SELECT p.id FROM pieces_jointes p
+        JOIN reclamations r ON r.id = p.reclamation_id
+        WHERE r.numero_compte = '8889990001'
+        """
+    ).fetchone()["id"]
+
+    for variant in ("thumb", "display"):
+        assert agent.get(f"/pieces/{piece_id}/{variant}").status_code == 404
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pytest
+
+import database
+
+def test_failed_batch_is_retried(app):
+    from reminder_worker import ReminderSchedule
+    from time_utils import now_local
+
+    schedule = ReminderSchedule()
+    now = now_local()
+    schedule.schedule(1, now - timedelta(minutes=1))
+    schedule.schedule(2, now - timedelta(minutes=1))
+    due = schedule.pop_due(now)
+    assert sorted(due) == [1, 2]
+
+    # Reminder 2 was rescheduled while the batch was failing: keep that date.
+    later = now + timedelta(hours=1)
+    schedule.schedule(2, later)
+    schedule.retry(due, now + timedelta(seconds=60))
+
+    assert schedule.pop_due(now) == []
+    assert schedule.pop_due(now + timedelta(seconds=61)) == [1]
+    assert schedule.pop_due(later) == [2]
+
+def test_reminders_are_sent_after_the_flag_is_stored(agent, db, monkeypatch):
+    import reminder_worker
+
+    type_id = db.execute(
+        "SELECT id FROM types_reclamation WHERE actif = 1 AND code != 'AUTRE' ORDER BY id LIMIT 1"
+    ).fetchone()["id"]
+    response = agent.post(
+        "/api/reclamations",
+        json=[{"numero_compte": "2223334445", "nom_client": "Rakotobe Vola", "type_id": type_id}],
+    )
+    created = response.get_json()["created"][0]
+    db.execute(
+        "UPDATE reclamations SET reminder_auto_at = '2000-01-01 00:00:00' WHERE id = ?",
+        (created["id"],),
+    )
+    db.commit()
+
+    sent = []
+    monkeypatch.setattr(reminder_worker, "send_desktop_notification", lambda title, message: sent.append(message))
+    commit = database.DBConn.commit
+
+    def failing_commit(self):
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(database.DBConn, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        reminder_worker._process_due_reminders()
+    assert sent == []
+
+    monkeypatch.setattr(database.DBConn, "commit", commit)
+    reminder_worker._process_due_reminders()
+    reminder_worker._process_due_reminders()
+    assert len([message for message in sent if created["numero_dossier"] in message]) == 1
+
+def test_resync_keeps_reminders_scheduled_after_the_read():
+    from reminder_worker import ReminderSchedule
+    from time_utils import now_local
+
+    schedule = ReminderSchedule()
+    now = now_local()
+    # Loaded from the database before reminder 2 was moved to a later date.
+    schedule.schedule(2, now + timedelta(hours=2))
+    schedule.schedule(3, now + timedelta(minutes=30))
+    schedule.merge([(1, now - timedelta(minutes=1)), (2, now - timedelta(minutes=1))])
+
+    assert schedule.pop_due(now) == [1]
+    assert schedule.pop_due(now + timedelta(hours=2)) == [3, 2]
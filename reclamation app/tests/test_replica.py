@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+from flask import Flask
+
+import database
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = [("value",)]
+
+    def execute(self, sql, params=()):
+        self.conn.log.append(" ".join(sql.split()))
+        if "pg_is_in_recovery" in sql:
+            self.conn.probe_started.set()
+            self.conn.release_probe.wait(5)
+            if self.conn.lag is None:
+                raise RuntimeError("replica down")
+
+    def fetchone(self):
+        return (self.conn.lag,)
+
+    def fetchall(self):
+        return [(1,)]
+
+class _Conn:
+    def __init__(self, name, lag=0):
+        self.name = name
+        self.lag = lag
+        self.log = []
+        self.probe_started = threading.Event()
+        self.release_probe = threading.Event()
+        self.release_probe.set()
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class _Pool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.out = 0
+
+    def acquire(self):
+        self.out += 1
+        return self.conn
+
+    def release(self, conn):
+        self.out -= 1
+
+    def stats(self):
+        return {"open": self.out}
+
+@pytest.fixture
+def routed(monkeypatch):
+    primary, replica = _Conn("primary"), _Conn("replica")
+    monkeypatch.setattr(database, "_USE_POSTGRES", True)
+    monkeypatch.setattr(database, "_pool", _Pool(primary))
+    monkeypatch.setattr(database, "_replica_pool", _Pool(replica))
+    monkeypatch.setattr(
+        database,
+        "_replica_state",
+        {"checked_at": None, "healthy": False, "lag_seconds": None, "reads": 0, "fallbacks": 0},
+    )
+    app = Flask(__name__)
+    app.secret_key = "test"
+    database.init_app(app)
+    return app, primary, replica
+
+def _connection_name(db):
+    return db.conn.name
+
+def test_cache_refill_reads_from_primary_without_sticking(routed):
+    app, primary, replica = routed
+
+    @app.get("/page")
+    def page():
+        db = database.get_db()
+        db.execute("SELECT 1")
+        before = _connection_name(db)
+        refill = database.get_db(primary=True)
+        refill.execute("SELECT 2")
+        return f"{before} {_connection_name(refill)}"
+
+    client = app.test_client()
+    assert client.get("/page").get_data(as_text=True) == "replica primary"
+    # A refill is not a write: the next page still reads from the replica.
+    assert client.get("/page").get_data(as_text=True) == "replica primary"
+    assert database._pool.out == 0 and database._replica_pool.out == 0
+
+def test_replica_unhealthy_while_probe_in_flight(routed):
+    app, primary, replica = routed
+    replica.release_probe.clear()
+    verdicts = []
+    probe = threading.Thread(target=lambda: verdicts.append(database._replica_usable()))
+    probe.start()
+    assert replica.probe_started.wait(5)
+
+    assert database._replica_usable() is False
+
+    replica.release_probe.set()
+    probe.join(5)
+    assert verdicts == [True]
+
+def test_failed_probe_falls_back_to_primary(routed):
+    app, primary, replica = routed
+    replica.lag = None
+
+    assert database._replica_usable() is False
+    assert database._replica_state["healthy"] is False
+
+def test_replica_connections_have_timeouts(monkeypatch):
+    opened = []
+
+    def fake_connect(url=None, timeout=None):
+        conn = _Conn("replica")
+        opened.append((timeout, conn))
+        return conn
+
+    monkeypatch.setattr(database, "_connect", fake_connect)
+    database._connect_replica()
+
+    timeout, conn = opened[0]
+    assert timeout and timeout > database.DB_REPLICA_TIMEOUT_SECONDS
+    assert conn.log == [f"SET statement_timeout = {int(database.DB_REPLICA_TIMEOUT_SECONDS * 1000)}", "COMMIT"]
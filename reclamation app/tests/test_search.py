@@ -0,0 +1,67 @@
+def _create(agent, db, numero_compte, nom_client):
+    type_id = db.execute(
+        "SELECT id FROM types_reclamation WHERE actif = 1 AND code != 'AUTRE' ORDER BY id LIMIT 1"
+    ).fetchone()["id"]
+    response = agent.post(
+        "/api/reclamations",
+        json=[{"numero_compte": numero_compte, "nom_client": nom_client, "type_id": type_id}],
+    )
+    assert response.status_code == 201
+    return response.get_json()["created"][0]["numero_dossier"]
+
+def test_search_by_partial_account_number(agent, db):
+    dossier = _create(agent, db, "9876012300", "Rabe Hery")
+    other = _create(agent, db, "5550000001", "Rabe Fanja")
+
+    for search in ("0123", "876012", "9876012300"):
+        page = agent.get(f"/dashboard?search={search}").get_data(as_text=True)
+        assert dossier in page
+        assert other not in page
+
+def test_search_by_partial_dossier_number(agent, db):
+    dossier = _create(agent, db, "1112223334", "Ravelo Tojo")
+    suffix = dossier.rsplit("-", 1)[1]
+
+    page = agent.get(f"/dashboard?search={suffix[1:]}").get_data(as_text=True)
+    assert dossier in page
+
+def test_search_by_name_prefix(agent, db):
+    dossier = _create(agent, db, "4445556667", "Razafindrakoto Mialy")
+
+    page = agent.get("/dashboard?search=razafin").get_data(as_text=True)
+    assert dossier in page
+
+def _plan(db, search):
+    from search import search_source
+    source, params = search_source(db, search)
+    rows = db.execute(
+        f"EXPLAIN QUERY PLAN SELECT r.id FROM {source} WHERE r.archived = 0", params
+    ).fetchall()
+    return [row["detail"] for row in rows]
+
+def test_search_scans_the_index_once_before_reclamations(app, db):
+    for search in ("rabe", "rabe 0123"):
+        plan = _plan(db, search)
+        fts = [i for i, step in enumerate(plan) if "reclamations_fts" in step]
+        lookup = [i for i, step in enumerate(plan) if "SEARCH r USING INTEGER PRIMARY KEY" in step]
+        assert len([i for i in fts if plan[i].startswith("SCAN")]) == 1
+        assert lookup and fts[0] < lookup[0]
+        assert "SCAN r" not in plan
+
+def test_ranked_search_pages_by_offset_without_total(agent, db, monkeypatch):
+    import reclamations
+    dossiers = {_create(agent, db, f"77700000{n}0", f"Randria Lova{n}") for n in range(3)}
+
+    first = agent.get("/dashboard?search=randria&per_page=2").get_data(as_text=True)
+    assert "reclamation(s)" not in first
+    assert "page=2" in first
+    second = agent.get("/dashboard?search=randria&per_page=2&page=2").get_data(as_text=True)
+    seen = [d for d in dossiers if d in first] + [d for d in dossiers if d in second]
+    assert sorted(seen) == sorted(dossiers)
+
+    counted = agent.get("/dashboard?search=randria&count=1").get_data(as_text=True)
+    assert "3 reclamation(s)" in counted
+
+    monkeypatch.setattr(reclamations, "SEARCH_MAX_RESULTS", 2)
+    bounded = agent.get("/dashboard?search=randria&per_page=2").get_data(as_text=True)
+    assert "page=2" not in bounded
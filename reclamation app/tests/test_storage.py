@@ -0,0 +1,57 @@
+import os
+import time
+
+import storage
+
+def _reclamation_id(agent, db):
+    type_id = db.execute(
+        "SELECT id FROM types_reclamation WHERE actif = 1 AND code != 'AUTRE' ORDER BY id LIMIT 1"
+    ).fetchone()["id"]
+    response = agent.post(
+        "/api/reclamations",
+        json=[{"numero_compte": "3216549870", "nom_client": "Rasoanaivo Njaka", "type_id": type_id}],
+    )
+    assert response.status_code == 201
+    return response.get_json()["created"][0]["id"]
+
+def _attach(db, tmp_path, reclamation_id, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    sha256, size = storage.save_file(str(path))
+    storage.add_ref(db, sha256, size)
+    piece_id = db.execute(
+        """
+        INSERT INTO pieces_jointes (reclamation_id, filename, original_name, uploaded_at, sha256)
+        VALUES (?, ?, ?, '2024-01-01 00:00:00', ?)
+        """,
+        (reclamation_id, f"x_{name}", name, sha256),
+    ).lastrowid
+    db.commit()
+    return piece_id, sha256
+
+def _age(sha256):
+    old = time.time() - 7200
+    os.utime(storage.blob_path(sha256), (old, old))
+
+def _ref_count(db, sha256):
+    row = db.execute("SELECT ref_count FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    return None if row is None else row["ref_count"]
+
+def test_collect_garbage_recounts_from_pieces(agent, db, tmp_path):
+    reclamation_id = _reclamation_id(agent, db)
+    kept_id, shared = _attach(db, tmp_path, reclamation_id, "a.pdf", b"%PDF-1 shared")
+    dropped_id, _ = _attach(db, tmp_path, reclamation_id, "b.pdf", b"%PDF-1 shared")
+    only_id, single = _attach(db, tmp_path, reclamation_id, "c.pdf", b"%PDF-1 single")
+    assert _ref_count(db, shared) == 2
+
+    db.execute("DELETE FROM pieces_jointes WHERE id IN (?, ?)", (dropped_id, only_id))
+    db.commit()
+    _age(shared)
+    _age(single)
+
+    storage.collect_garbage(db)
+
+    assert os.path.exists(storage.blob_path(shared))
+    assert _ref_count(db, shared) == 1
+    assert not os.path.exists(storage.blob_path(single))
+    assert _ref_count(db, single) is None
@@ -5,3 +5,16 @@ def now_local():
 
 def now_local_str():
     return now_local().strftime("%Y-%m-%d %H:%M:%S")
+
+def parse_dt(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except Exception:
+        try:
+            return datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S")
+        except Exception:
+            return None